@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+import subprocess
+from visualcaptcha import *
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+bundledImages = list(Captcha(Session({})).getAllImageOptions())
+
+
+# Create a catalog of count images, reusing the bundled image files
+def syntheticImages(count):
+    images = []
+
+    for i in range(count):
+        image = bundledImages[i % len(bundledImages)]
+
+        images.append({
+            'name': '%s %d' % (image['name'], i),
+            'path': image['path']
+        })
+
+    return images
+
+
+# Run func iterations times in each of the threads, and return the timings
+def timeCase(func, iterations, threads):
+    def run():
+        for i in range(iterations):
+            func()
+
+    # Warm up caches before timing
+    run()
+
+    workers = [threading.Thread(target=run) for i in range(threads)]
+
+    start = timer()
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    elapsed = timer() - start
+    operations = iterations * threads
+
+    return {
+        'operations': operations,
+        'seconds': elapsed,
+        'opsPerSecond': operations / elapsed if elapsed else None,
+        'microsecondsPerOp': elapsed * 1000000 / operations
+    }
+
+
+# Each case returns a function to time, with the captcha it needs already generated
+def generateCase(catalogSize, numberOfOptions):
+    images = syntheticImages(catalogSize) if catalogSize != len(bundledImages) else []
+
+    def setup():
+        visualCaptcha = Captcha(Session({}), False, images)
+
+        return lambda: visualCaptcha.generate(numberOfOptions)
+
+    return setup
+
+
+def generatedCase(method, args=(), assetCache=None):
+    def setup():
+        visualCaptcha = Captcha(Session({}), assetCache=assetCache)
+        visualCaptcha.generate()
+
+        func = getattr(visualCaptcha, method)
+
+        if (method == 'validateImage'):
+            callArgs = (visualCaptcha.getValidImageOption()['value'],)
+        elif (method == 'validateAudio'):
+            callArgs = (visualCaptcha.getValidAudioOption()['value'],)
+        else:
+            callArgs = ({},) + tuple(args)
+
+        return lambda: func(*callArgs)
+
+    return setup
+
+
+def sessionCase():
+    def setup():
+        session = Session({})
+
+        def func():
+            session.set('test', 'awesome')
+            session.get('test')
+
+        return func
+
+    return setup
+
+
+# Measure the memory held by 10k catalog entries, as plain dicts and as a Catalog's OptionRecords
+def optionMemory(count=10000):
+    if tracemalloc is None:
+        return None
+
+    images = syntheticImages(count)
+
+    def measure(build):
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        options = build()
+        size = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+
+        # Keep the options alive until they're measured
+        del options
+
+        return size
+
+    # The strings are shared with the source list in both cases, so only the containers are counted
+    dictBytes = measure(lambda: tuple(dict(image) for image in images))
+    recordBytes = measure(lambda: tuple(OptionRecord.fromDict(image) for image in images))
+
+    return {
+        'entries': count,
+        'dictBytes': dictBytes,
+        'recordBytes': recordBytes,
+        'savedBytes': dictBytes - recordBytes
+    }
+
+
+# Measure how long importing the package takes in fresh interpreters, in milliseconds, and return the median
+def importTime(runs=5):
+    script = 'import time; timer = getattr(time, "perf_counter", time.time); start = timer(); import visualcaptcha; print((timer() - start) * 1000)'
+    packagePath = os.path.dirname(os.path.abspath(__file__))
+
+    timings = sorted(float(subprocess.check_output([sys.executable, '-c', script], cwd=packagePath)) for i in range(runs))
+
+    return timings[len(timings) // 2]
+
+
+def cases(catalogSizes):
+    assetCache = AssetCache()
+
+    result = []
+
+    for catalogSize in catalogSizes:
+        for numberOfOptions in (4, 5, 10):
+            result.append(('generate', {'catalogSize': catalogSize, 'numberOfOptions': numberOfOptions}, generateCase(catalogSize, numberOfOptions)))
+
+    for isRetina in (False, True):
+        result.append(('streamImage', {'isRetina': isRetina}, generatedCase('streamImage', (0, isRetina))))
+        result.append(('streamImage', {'isRetina': isRetina, 'assetCache': True}, generatedCase('streamImage', (0, isRetina), assetCache)))
+
+    for fileType in ('mp3', 'ogg'):
+        result.append(('streamAudio', {'fileType': fileType}, generatedCase('streamAudio', (fileType,))))
+        result.append(('streamAudio', {'fileType': fileType, 'assetCache': True}, generatedCase('streamAudio', (fileType,), assetCache)))
+
+    result.append(('validateImage', {}, generatedCase('validateImage')))
+    result.append(('validateAudio', {}, generatedCase('validateAudio')))
+    result.append(('sessionGetSet', {}, sessionCase()))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the visualCaptcha API')
+    parser.add_argument('--output', default='bench_output.json', help='JSON file to write the results to')
+    parser.add_argument('--iterations', type=int, default=2000, help='Iterations per thread for each case')
+    parser.add_argument('--threads', default='1,4', help='Comma separated thread counts')
+    parser.add_argument('--compare', help='JSON file from a previous run, to compare the results with')
+    parser.add_argument('--catalog-sizes', default='%d,1000,10000' % len(bundledImages), help='Comma separated image catalog sizes for generate')
+    parser.add_argument('--import-budget', type=float, default=100, help='Milliseconds import visualcaptcha may take. The benchmark fails if it takes longer')
+    arguments = parser.parse_args()
+
+    threadCounts = [int(count) for count in arguments.threads.split(',')]
+    catalogSizes = [int(size) for size in arguments.catalog_sizes.split(',')]
+
+    results = []
+
+    for name, params, setup in cases(catalogSizes):
+        for threads in threadCounts:
+            result = {'name': name, 'params': params, 'threads': threads}
+
+            try:
+                result.update(timeCase(setup(), arguments.iterations, threads))
+            except Exception as e:
+                # Keep going, so one broken case doesn't hide the others
+                result['error'] = '%s: %s' % (type(e).__name__, e)
+
+            results.append(result)
+
+            print('%-14s %-55s threads=%d %s' % (name, json.dumps(params, sort_keys=True), threads,
+                  result.get('error') or '%.2f us/op' % result['microsecondsPerOp']))
+
+    memory = optionMemory()
+
+    if memory:
+        print('%-14s %d entries: %d bytes as dicts, %d bytes as records' % ('optionMemory', memory['entries'], memory['dictBytes'], memory['recordBytes']))
+
+    importMilliseconds = importTime()
+
+    print('%-14s %.1f ms, budget %.1f ms' % ('importTime', importMilliseconds, arguments.import_budget))
+
+    output = {
+        'python': sys.version,
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'gilEnabled': getattr(sys, '_is_gil_enabled', lambda: True)(),
+        'timestamp': int(time.time()),
+        'iterations': arguments.iterations,
+        'optionMemory': memory,
+        'importMilliseconds': importMilliseconds,
+        'results': results
+    }
+
+    with open(arguments.output, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+
+    print('Results written to ' + os.path.abspath(arguments.output))
+
+    if arguments.compare:
+        compare(arguments.compare, results)
+
+    if importMilliseconds > arguments.import_budget:
+        print('import visualcaptcha took %.1f ms, over the %.1f ms budget' % (importMilliseconds, arguments.import_budget))
+
+        return 1
+
+    return 0
+
+
+# Print how much slower or faster each case is than in a previous run
+def compare(filePath, results):
+    with open(filePath) as f:
+        previousResults = json.load(f)['results']
+
+    previous = dict((caseKey(result), result) for result in previousResults)
+
+    for result in results:
+        previousResult = previous.get(caseKey(result))
+
+        if not previousResult or 'error' in result or 'error' in previousResult:
+            continue
+
+        ratio = result['microsecondsPerOp'] / previousResult['microsecondsPerOp']
+
+        print('%-14s %-55s threads=%d %.2fx %s' % (result['name'], json.dumps(result['params'], sort_keys=True), result['threads'],
+              ratio, 'slower' if ratio > 1 else 'faster'))
+
+
+def caseKey(result):
+    return (result['name'], json.dumps(result['params'], sort_keys=True), result['threads'])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+from visualcaptcha import *
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+if sys.version_info[0] >= 3:
+    from http.client import HTTPConnection
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlencode
+else:
+    from httplib import HTTPConnection
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urllib import urlencode
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+# Minimal WSGI app serving visualCaptcha, with the sessions in an in-process store
+class CaptchaApp(object):
+
+    # @param backend is the SessionBackend to store the sessions in
+    # @param assetCache is optional. An AssetCache to stream the files from
+    # @param streamed is optional. If true, the files are sent as AssetStreams
+    def __init__(self, backend, assetCache=None, streamed=False):
+        self.backend = backend
+        self.assetCache = assetCache
+        self.streamed = streamed
+
+    def __call__(self, environ, start_response):
+        try:
+            return self.route(environ, start_response)
+        except Exception:
+            start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
+
+            return [b'Internal Server Error']
+
+    def route(self, environ, start_response):
+        parts = environ.get('PATH_INFO', '').strip('/').split('/')
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        cookie = environ.get('HTTP_COOKIE', '')
+        sessionId = cookie[4:] if cookie.startswith('sid=') else 'anonymous'
+
+        visualCaptcha = Captcha(BackendSession(self.backend, sessionId), assetCache=self.assetCache)
+        headers = {}
+
+        if (parts[0] == 'start' and len(parts) == 2):
+            visualCaptcha.generate(parts[1])
+
+            return self.respond(start_response, json.dumps(visualCaptcha.getFrontendData()).encode('utf-8'), {'Content-Type': 'application/json'})
+
+        if (parts[0] == 'image' and len(parts) == 2):
+            isRetina = query.get('retina', ['0'])[0] == '1'
+
+            return self.respond(start_response, visualCaptcha.streamImage(headers, parts[1], isRetina, self.streamed), headers)
+
+        if (parts[0] == 'bundle'):
+            isRetina = query.get('retina', ['0'])[0] == '1'
+
+            return self.respond(start_response, visualCaptcha.streamImageBundle(headers, isRetina), headers)
+
+        if (parts[0] == 'audio'):
+            fileType = parts[1] if len(parts) == 2 else 'mp3'
+
+            return self.respond(start_response, visualCaptcha.streamAudio(headers, fileType, self.streamed, environ.get('HTTP_RANGE')), headers)
+
+        if (parts[0] == 'try' and environ.get('REQUEST_METHOD') == 'POST'):
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            form = parse_qs(environ['wsgi.input'].read(length).decode('utf-8'))
+            frontendData = visualCaptcha.getFrontendData() or {}
+
+            if (frontendData.get('imageFieldName') in form):
+                valid = visualCaptcha.validateImage(form[frontendData['imageFieldName']][0])
+            elif (frontendData.get('audioFieldName') in form):
+                valid = visualCaptcha.validateAudio(form[frontendData['audioFieldName']][0])
+            else:
+                valid = False
+
+            return self.respond(start_response, json.dumps({'valid': valid}).encode('utf-8'), {'Content-Type': 'application/json'})
+
+        return self.respond(start_response, False, headers)
+
+    def respond(self, start_response, content, headers):
+        if (content is False):
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+
+            return [b'Not Found']
+
+        status = '206 Partial Content' if 'Content-Range' in headers else '200 OK'
+
+        if ('Content-Length' not in headers):
+            headers['Content-Length'] = str(len(content))
+
+        start_response(status, [(key, str(value)) for key, value in headers.items()])
+
+        return content if self.streamed and not isinstance(content, bytes) else [content]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+# Run the captcha flows of one simulated user, recording each request's latency
+def runClient(port, flows, images, bundle, latencies, errors):
+    connection = HTTPConnection('127.0.0.1', port)
+
+    def request(endpoint, method, path, body=None, headers=None):
+        start = timer()
+
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        content = response.read()
+
+        latencies[endpoint].append(timer() - start)
+
+        if response.status >= 400:
+            errors.append(endpoint)
+
+        return content
+
+    for i in range(flows):
+        cookie = {'Cookie': 'sid=' + uuid.uuid4().hex}
+
+        frontendData = json.loads(request('start', 'GET', '/start/%d' % images, headers=cookie).decode('utf-8'))
+
+        if bundle:
+            request('bundle', 'GET', '/bundle', headers=cookie)
+        else:
+            # Half the images are fetched in retina
+            for index in range(images):
+                request('image', 'GET', '/image/%d?retina=%d' % (index, index % 2), headers=cookie)
+
+        request('audio', 'GET', '/audio/mp3', headers=cookie)
+
+        # Try a random image, or a random audio answer
+        if random.random() < 0.5:
+            form = {frontendData['imageFieldName']: random.choice(frontendData['values'])}
+        else:
+            form = {frontendData['audioFieldName']: str(random.randint(0, 20))}
+
+        cookie['Content-Type'] = 'application/x-www-form-urlencoded'
+        request('try', 'POST', '/try', urlencode(form), cookie)
+
+    connection.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+# Peak resident memory of this process (server and clients), in MB
+def peakRSS():
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports KB, macOS bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test visualCaptcha with full captcha flows over HTTP')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of simulated users at once')
+    parser.add_argument('--flows', type=int, default=50, help='Captcha flows per simulated user')
+    parser.add_argument('--images', type=int, default=5, help='Images per captcha')
+    parser.add_argument('--asset-cache', action='store_true', help='Stream the files from an AssetCache')
+    parser.add_argument('--pack', help='Stream the files from a PackStore, built at this path')
+    parser.add_argument('--streamed', action='store_true', help='Send the files as AssetStreams')
+    parser.add_argument('--bundle', action='store_true', help='Fetch all the images of a captcha in a single request')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    arguments = parser.parse_args()
+
+    assetCache = AssetCache() if arguments.asset_cache else None
+
+    if arguments.pack:
+        assetCache = PackStore.build(arguments.pack)
+
+    app = CaptchaApp(MemoryBackend(), assetCache, arguments.streamed)
+
+    server = make_server('127.0.0.1', 0, app, ThreadingWSGIServer, QuietHandler)
+    port = server.server_address[1]
+
+    serverThread = threading.Thread(target=server.serve_forever)
+    serverThread.daemon = True
+    serverThread.start()
+
+    endpoints = ('start', 'bundle' if arguments.bundle else 'image', 'audio', 'try')
+    latencies = dict((endpoint, []) for endpoint in endpoints)
+    errors = []
+
+    clients = [threading.Thread(target=runClient, args=(port, arguments.flows, arguments.images, arguments.bundle, latencies, errors)) for i in range(arguments.concurrency)]
+
+    start = timer()
+
+    for client in clients:
+        client.start()
+
+    for client in clients:
+        client.join()
+
+    elapsed = timer() - start
+
+    server.shutdown()
+
+    requests = sum(len(values) for values in latencies.values())
+    results = {
+        'concurrency': arguments.concurrency,
+        'flows': arguments.flows * arguments.concurrency,
+        'seconds': elapsed,
+        'flowsPerSecond': arguments.flows * arguments.concurrency / elapsed,
+        'requestsPerSecond': requests / elapsed,
+        'peakRSSMegabytes': peakRSS(),
+        'endpoints': {}
+    }
+
+    for endpoint in endpoints:
+        values = sorted(latencies[endpoint])
+
+        results['endpoints'][endpoint] = {
+            'requests': len(values),
+            'errors': errors.count(endpoint),
+            'p50Milliseconds': percentile(values, 0.50) * 1000 if values else None,
+            'p95Milliseconds': percentile(values, 0.95) * 1000 if values else None,
+            'p99Milliseconds': percentile(values, 0.99) * 1000 if values else None
+        }
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,28 @@
 import os
+import sys
+import copy
+import random
+import json
+import base64
+import binascii
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
 import unittest
 from visualcaptcha import *
 
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 assetsFullPath = os.path.dirname(os.path.realpath(__file__)) + '/visualcaptcha/assets'
 visualCaptcha = None
 sessionMock = {}
@@ -69,6 +90,14 @@ class SetupTest(unittest.TestCase):
         self.assertEqual(obtainedImages[0]['name'], 'Test')
         self.assertEqual(obtainedImages[0]['path'], 'test.png')
 
+        # It's a plain list of dicts, like the one sent
+        self.assertEqual(obtainedImages, imageOptions)
+        self.assertEqual(json.loads(json.dumps(obtainedImages)), imageOptions)
+        self.assertEqual(obtainedImages + [], imageOptions)
+        self.assertEqual(visualCaptcha.imageOptions, imageOptions)
+        self.assertEqual(visualCaptcha.imageOptions + [], imageOptions)
+        self.assertNotEqual(visualCaptcha.imageOptions, [])
+
     # Should allow an array of dicts to be used instead of the default audios for options
     def test_audio_array(self):
         global sessionMock
@@ -94,6 +123,490 @@ class SetupTest(unittest.TestCase):
         self.assertEqual(obtainedAudios[0]['value'], 'test')
 
 
+# Test the shared Catalog
+class CatalogTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should share the same catalog between Captcha instances with the same assets
+    def test_shared_catalog(self):
+        firstCaptcha = Captcha(Session({}))
+        secondCaptcha = Captcha(Session({}))
+
+        self.assertIs(firstCaptcha.catalog, secondCaptcha.catalog)
+        self.assertIs(firstCaptcha.imageOptions, secondCaptcha.imageOptions)
+
+    # Should use a different catalog for different option lists
+    def test_different_catalog(self):
+        imageOptions = [{
+            'name': 'Test',
+            'path': 'test.png'
+        }]
+
+        firstCaptcha = Captcha(Session({}))
+        secondCaptcha = Captcha(Session({}), False, imageOptions)
+
+        self.assertIsNot(firstCaptcha.catalog, secondCaptcha.catalog)
+        self.assertIs(secondCaptcha.catalog, Captcha(Session({}), False, imageOptions).catalog)
+
+    # Should keep a bounded number of catalogs for custom option lists, found by identity
+    def test_custom_catalogs(self):
+        imageOptions = [{
+            'name': 'Test',
+            'path': 'test.png'
+        }]
+        catalog = Catalog.load('', imageOptions)
+
+        # New lists with the same options share the catalog
+        self.assertIs(Catalog.load('', [dict(imageOptions[0])]), catalog)
+        self.assertIs(Captcha(Session({}), '', [dict(imageOptions[0])]).catalog, catalog)
+
+        for i in range(Catalog.maxCustomCatalogs * 2):
+            Catalog.load('', [{'name': 'Test', 'path': 'test%d.png' % i}])
+
+        self.assertEqual(len(Catalog._customCatalogs), Catalog.maxCustomCatalogs)
+        self.assertIsNot(Catalog.load('', imageOptions), catalog)
+        self.assertIs(Catalog.load('', imageOptions), Catalog.load('', imageOptions))
+        self.assertIs(Catalog.load(Catalog.defaultAssetsPath), Catalog.load())
+
+        # Changing a list once it's loaded gets another catalog
+        imageOptions[0]['name'] = 'Changed'
+
+        self.assertEqual(Catalog.load('', imageOptions).imageOptions[0]['name'], 'Changed')
+        self.assertIs(Catalog.load('', [{'name': 'Test', 'path': 'test.png', 'tags': ['a']}]), Catalog.load('', [{'name': 'Test', 'path': 'test.png', 'tags': ['a']}]))
+
+    # Should not change the catalog options when generating
+    def test_generate_keeps_catalog(self):
+        global visualCaptcha
+
+        firstOptions = list(visualCaptcha.getAllImageOptions())
+
+        visualCaptcha.generate()
+
+        self.assertEqual(firstOptions, list(visualCaptcha.getAllImageOptions()))
+
+        for imageOption in visualCaptcha.getAllImageOptions():
+            self.assertNotIn('value', imageOption)
+
+
+# Test PackStore
+class PackStoreTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        self.packPath = os.path.dirname(os.path.realpath(__file__)) + '/test_assets.pack'
+
+    # Runs after each test in this group
+    def tearDown(self):
+        if os.path.isfile(self.packPath):
+            os.remove(self.packPath)
+
+    # Should give the files as memoryviews of the pack
+    def test_get(self):
+        global assetsFullPath
+
+        packStore = PackStore.build(self.packPath)
+        filePath = assetsFullPath + '/images/airplane@2x.png'
+
+        with open(filePath, 'rb') as f:
+            fileContent = f.read()
+
+        self.assertIn(filePath, packStore)
+
+        # Python 2 mmaps don't support memoryview, so their files are copies
+        self.assertIsInstance(packStore.get(filePath), memoryview if sys.version_info >= (3,) else bytes)
+        self.assertEqual(bytes(packStore.get(filePath)), fileContent)
+        self.assertIsNone(packStore.get(assetsFullPath + '/images/missing.png'))
+        self.assertEqual(packStore.stats()['files'], len(os.listdir(assetsFullPath + '/images')) + len(os.listdir(assetsFullPath + '/audios')))
+        self.assertEqual(packStore.stats()['hits'], 2)
+
+        self.assertRaises(ValueError, PackStore, filePath)
+
+    # Should stream, inline and range the files from the pack
+    def test_stream(self):
+        packStore = PackStore.build(self.packPath)
+        visualCaptcha = Captcha(Session({}), assetCache=packStore)
+        visualCaptcha.generate()
+
+        with open(visualCaptcha.getImageFilePath(0, True), 'rb') as f:
+            fileContent = f.read()
+
+        content = visualCaptcha.streamImage({}, 0, True)
+
+        self.assertIsInstance(content, bytes)
+        self.assertTrue(content.startswith(fileContent))
+
+        stream = visualCaptcha.streamImage({}, 0, True, True)
+
+        self.assertTrue(b''.join(stream).startswith(fileContent))
+
+        headers = {}
+        fullContent = visualCaptcha.streamAudio({})
+
+        self.assertEqual(visualCaptcha.streamAudio(headers, rangeHeader='bytes=10-99'), fullContent[10:100])
+        self.assertEqual(len(visualCaptcha.getInlineFrontendData()['imageData']), 5)
+
+        visualCaptcha = Captcha(Session({}), assetCache=packStore, noiseVariants=NoiseVariants())
+        visualCaptcha.generate()
+
+        self.assertIsInstance(visualCaptcha.streamImage({}, 0), bytes)
+
+    # Should count the hits of every thread, and keep the base64 encoding of the pack files
+    def test_counters(self):
+        global assetsFullPath
+
+        packStore = PackStore.build(self.packPath)
+        filePath = assetsFullPath + '/images/airplane.png'
+
+        def run():
+            for i in range(10):
+                packStore.get(filePath)
+
+        threads = [threading.Thread(target=run) for i in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        run()
+
+        self.assertEqual(packStore.stats()['hits'], 50)
+        self.assertEqual(len(packStore._counters), 1)
+
+        encoded = packStore.getBase64(filePath)
+
+        with open(filePath, 'rb') as f:
+            self.assertEqual(base64.b64decode(encoded[0]) + encoded[1], f.read())
+
+        self.assertIs(packStore.getBase64(filePath), encoded)
+        self.assertEqual(packStore.stats()['hits'], 52)
+        self.assertIsNone(packStore.getBase64(assetsFullPath + '/images/missing.png'))
+
+    # Should read all the pages, without counting them as hits
+    def test_preload(self):
+        packStore = PackStore.build(self.packPath)
+        packStore.preload()
+
+        self.assertEqual(packStore.stats()['hits'], 0)
+
+
+# Test warmup and the package import
+class WarmupTest(unittest.TestCase):
+
+    # Runs after each test in this group
+    def tearDown(self):
+        Catalog.clear()
+
+    # Should load the shared catalog, the mime types and the asset bytes
+    def test_warmup(self):
+        global assetsFullPath
+
+        Catalog.clear()
+        assetCache = AssetCache()
+        catalog = warmup(assetCache=assetCache)
+
+        self.assertIs(Captcha(Session({})).catalog, catalog)
+        self.assertEqual(catalog.assetsPath, assetsFullPath)
+        self.assertEqual(Captcha._mimeTypes['.png'], 'image/png')
+        self.assertEqual(Captcha._mimeTypes['.mp3'], 'audio/mpeg')
+        self.assertIn('.ogg', Captcha._mimeTypes)
+        self.assertIn(assetsFullPath + '/images/airplane.png', assetCache)
+
+        images = [{'name': 'Airplane', 'path': 'airplane.png'}]
+
+        self.assertEqual(len(warmup(defaultImages=images).imageOptions), 1)
+
+    # Should import the package without asyncio, sqlite3 or argparse, within the time budget
+    def test_import(self):
+        script = '\n'.join((
+            'import sys, time',
+            'timer = getattr(time, "perf_counter", time.time)',
+            'start = timer()',
+            'import visualcaptcha',
+            'elapsed = timer() - start',
+            'print(" ".join(name for name in ("asyncio", "sqlite3", "argparse") if name in sys.modules))',
+            'print(elapsed)',
+            'print(visualcaptcha.SqliteCatalog.__name__)'
+        ))
+
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=os.path.dirname(os.path.realpath(__file__)))
+        loaded, elapsed, lazyName = output.decode('utf-8').splitlines()
+
+        # Module __getattr__ is only available from Python 3.7, so older versions import SqliteCatalog eagerly
+        self.assertEqual(loaded, '' if sys.version_info >= (3, 7) else 'sqlite3')
+        self.assertEqual(lazyName, 'SqliteCatalog')
+
+        # Generous, so slow machines pass. benchmark.py has the stricter budget
+        self.assertLess(float(elapsed), 0.5)
+
+    # Should export the public classes only, without the modules they import
+    def test_star_import(self):
+        import visualcaptcha
+
+        namespace = {}
+        exec('from visualcaptcha import *', namespace)
+
+        self.assertEqual(len(visualcaptcha.__all__), len(set(visualcaptcha.__all__)))
+        self.assertIn('SqliteCatalog', namespace)
+        self.assertIn('warmup', namespace)
+
+        for name in ('sys', 'os', 'hmac', 'json', 'gc', 'Stream', 'Warmup', 'importlib', 'timer'):
+            self.assertNotIn(name, visualcaptcha.__all__)
+
+
+# Test Sampler
+class SamplerTest(unittest.TestCase):
+
+    # Should draw distinct indexes, without the excluded ones
+    def test_sample(self):
+        sampler = Sampler(10)
+
+        for i in range(200):
+            indexes = sampler.sample(5, (3, 7))
+
+            self.assertEqual(len(set(indexes)), 5)
+            self.assertNotIn(3, indexes)
+            self.assertNotIn(7, indexes)
+            self.assertTrue(all(0 <= index < 10 for index in indexes))
+
+        # All the indexes but the excluded ones
+        self.assertEqual(sorted(sampler.sample(8, (3, 7))), [0, 1, 2, 4, 5, 6, 8, 9])
+        self.assertRaises(ValueError, sampler.sample, 11)
+
+    # Should choose the excluded index only if it's the only one
+    def test_choice(self):
+        self.assertEqual(Sampler(1).choice(0), 0)
+        self.assertEqual(Sampler(2).choice(0), 1)
+        self.assertEqual(Sampler(2, [1, 100]).choice(1), 0)
+
+    # Should choose the options with a bigger weight more often
+    def test_weights(self):
+        sampler = Sampler(3, [1, 1, 18])
+        counts = [0, 0, 0]
+
+        for i in range(1000):
+            counts[sampler.choice()] += 1
+
+        self.assertTrue(counts[2] > 800)
+
+        for i in range(200):
+            indexes = sampler.sample(2, (2,))
+
+            self.assertEqual(sorted(indexes), [0, 1])
+
+        self.assertRaises(ValueError, Sampler, 2, [1])
+        self.assertRaises(ValueError, Sampler, 2, [1, 0])
+
+    # Should draw many samples and indexes at once, with the option weights
+    def test_sample_many(self):
+        for sampler in (Sampler(10), Sampler(10, [1] * 9 + [1000000])):
+            samples = sampler.sampleMany(100, 5)
+
+            self.assertEqual(len(samples), 100)
+
+            for indexes in samples:
+                self.assertEqual(len(set(indexes)), 5)
+                self.assertTrue(all(0 <= index < 10 for index in indexes))
+
+            indexes = sampler.choices(100)
+
+            self.assertEqual(len(indexes), 100)
+            self.assertTrue(all(0 <= index < 10 for index in indexes))
+
+        self.assertTrue(all(9 in indexes for indexes in sampler.sampleMany(20, 2)))
+        self.assertTrue(sampler.choices(20).count(9) > 15)
+        self.assertRaises(ValueError, sampler.sampleMany, 1, 11)
+
+    # Should generate with a single audio option, and use the option weights
+    def test_catalog(self):
+        audioOptions = [{
+            'path': 'cat.mp3',
+            'value': 'cat'
+        }]
+        imageOptions = [dict(imageOption) for imageOption in Captcha(Session({})).getAllImageOptions()]
+        imageOptions[0]['weight'] = 1000000
+
+        visualCaptcha = Captcha(Session({}), False, imageOptions, audioOptions)
+
+        for i in range(5):
+            visualCaptcha.generate()
+
+            self.assertEqual(visualCaptcha.getValidAudioOption()['value'], 'cat')
+            self.assertIn(imageOptions[0]['path'], [image['path'] for image in visualCaptcha.getImageOptions()])
+
+
+# Test OptionRecord
+class OptionRecordTest(unittest.TestCase):
+
+    # Should give back the same dict the record was created from
+    def test_to_dict(self):
+        for option in ({'name': 'Cat', 'path': 'cat.png'}, {'path': 'cat.mp3', 'value': 'cat'}, {'name': 'Cat', 'path': 'cat.png', 'weight': 2, 'value': None}):
+            self.assertEqual(OptionRecord.fromDict(option).toDict(), option)
+
+    # Should give a new dict each time an option is read from the catalog
+    def test_option_list(self):
+        imageOptions = Catalog.load().imageOptions
+
+        imageOption = imageOptions[0]
+        imageOption['value'] = 'changed'
+
+        self.assertNotIn('value', imageOptions[0])
+        self.assertEqual(imageOptions[:2], [imageOptions[0], imageOptions[1]])
+        self.assertEqual(len(list(imageOptions)), len(imageOptions))
+
+
+# Test SqliteCatalog
+class SqliteCatalogTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        self.databasePath = os.path.dirname(os.path.realpath(__file__)) + '/test_catalog.sqlite'
+        self.catalog = None
+
+    # Runs after each test in this group
+    def tearDown(self):
+        if self.catalog is not None:
+            self.catalog.close()
+
+        if os.path.isfile(self.databasePath):
+            os.remove(self.databasePath)
+
+    # Should generate, stream and validate with the options in SQLite
+    def test_sqlite_catalog(self):
+        catalog = self.catalog = SqliteCatalog.create(self.databasePath)
+        visualCaptcha = Captcha(Session({}), catalog=catalog)
+
+        self.assertEqual(len(visualCaptcha.getAllImageOptions()), len(Catalog.load().imageOptions))
+        self.assertEqual(list(visualCaptcha.getAllAudioOptions()), list(Catalog.load().audioOptions))
+        self.assertEqual(visualCaptcha.getAllImageOptions()[-1], Catalog.load().imageOptions[-1])
+
+        for i in range(10):
+            oldAudioOption = visualCaptcha.getValidAudioOption()
+
+            visualCaptcha.generate()
+
+            self.assertEqual(len(visualCaptcha.getImageOptions()), 5)
+            self.assertNotEqual(visualCaptcha.getValidAudioOption(), oldAudioOption)
+
+        self.assertTrue(visualCaptcha.streamImage({}, 0))
+        self.assertTrue(visualCaptcha.streamAudio({}))
+        self.assertTrue(visualCaptcha.validateImage(visualCaptcha.getValidImageOption()['value']))
+
+    # Should encode compact challenges with the SQLite ids
+    def test_sqlite_compact(self):
+        catalog = self.catalog = SqliteCatalog.create(self.databasePath)
+        session = Session({})
+
+        Captcha(session, catalog=catalog, compactSession=True).generate()
+
+        visualCaptcha = Captcha(session, catalog=catalog, compactSession=True)
+        challenge = catalog.decodeChallenge(session.get('challenge'))
+
+        self.assertEqual(challenge['images'], visualCaptcha.getImageOptions())
+        self.assertIsNone(catalog.decodeChallenge('1.2.3|0|100000|a,b,c|d|e'))
+
+    # Should read slices like the in-memory catalog
+    def test_sqlite_slices(self):
+        catalog = self.catalog = SqliteCatalog.create(self.databasePath)
+        imageOptions = Catalog.load().imageOptions
+
+        for index in (slice(None), slice(2, 5), slice(-3, None), slice(None, None, 7), slice(5, 2), slice(None, None, -4)):
+            self.assertEqual(catalog.imageOptions[index], imageOptions[index])
+
+    # Should close the connections of every thread, and open new ones on next use
+    def test_sqlite_close(self):
+        catalog = self.catalog = SqliteCatalog.create(self.databasePath)
+        connections = []
+
+        def run():
+            catalog.audioOptions[0]
+            connections.append(catalog.utilConnection())
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        catalog.close()
+
+        self.assertRaises(sqlite3.ProgrammingError, connections[0].execute, 'SELECT 1')
+        self.assertEqual(catalog.audioOptions[0], Catalog.load().audioOptions[0])
+
+    # Should fail without a database
+    def test_sqlite_missing(self):
+        self.assertRaises(IOError, SqliteCatalog, self.databasePath)
+
+
+# Test AssetCache
+class AssetCacheTest(unittest.TestCase):
+
+    # Should read a file once and serve it from memory afterwards
+    def test_cache_hits(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+        filePath = assetsFullPath + '/images/airplane.png'
+
+        firstContent = assetCache.get(filePath)
+        secondContent = assetCache.get(filePath)
+
+        self.assertTrue(firstContent)
+        self.assertIs(firstContent, secondContent)
+        self.assertEqual(assetCache.stats()['misses'], 1)
+        self.assertEqual(assetCache.stats()['hits'], 1)
+
+    # Should return None for files that don't exist
+    def test_cache_missing_file(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+
+        self.assertIsNone(assetCache.get(assetsFullPath + '/images/missing.png'))
+
+    # Should evict the least recently used files when over the memory ceiling
+    def test_cache_eviction(self):
+        assetCache = AssetCache(10)
+
+        assetCache.put('first', b'12345')
+        assetCache.put('second', b'12345')
+        assetCache.get('first')
+        assetCache.put('third', b'12345')
+
+        self.assertEqual(assetCache.stats()['evictions'], 1)
+        self.assertEqual(assetCache.stats()['size'], 10)
+        self.assertEqual(assetCache.get('first'), b'12345')
+        self.assertEqual(assetCache.stats()['hits'], 2)
+
+    # Should preload all the images and audios
+    def test_cache_preload(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+        assetCache.preload(assetsFullPath)
+
+        files = len(os.listdir(assetsFullPath + '/images')) + len(os.listdir(assetsFullPath + '/audios'))
+
+        self.assertEqual(assetCache.stats()['files'], files)
+
+    # Should stream images from the cache
+    def test_stream_from_cache(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+        assetCache.preload(assetsFullPath)
+
+        visualCaptcha = Captcha(Session({}), False, False, False, assetCache)
+        visualCaptcha.generate()
+
+        self.assertTrue(visualCaptcha.streamImage({}, 0))
+        self.assertTrue(visualCaptcha.streamAudio({}))
+        self.assertEqual(assetCache.stats()['misses'], 0)
+        self.assertEqual(assetCache.stats()['hits'], 2)
+
+
 # Test getAllImageOptions
 class ImageOptionsTest(unittest.TestCase):
 
@@ -290,140 +803,861 @@ class GenerateTest(unittest.TestCase):
         self.assertNotEqual(firstValue, secondValue)
 
 
-# Test validateImage
-class ValidateImageTest(unittest.TestCase):
+# Test TokenSource
+class TokenSourceTest(unittest.TestCase):
 
     # Runs before each test in this group
     def setUp(self):
         globalSetup()
 
-    # Should return true if the chosen image option is the valid one
-    def test_return_true_image(self):
-        global visualCaptcha
+    # Should create hex strings of the right length, without a bytes prefix
+    def test_hex(self):
+        tokenSource = TokenSource()
 
-        # Generate option values
-        visualCaptcha.generate()
+        token = tokenSource.hex(10)
 
-        optionValue = visualCaptcha.getValidImageOption()['value']
+        self.assertIsInstance(token, str)
+        self.assertEqual(len(token), 20)
+        self.assertEqual(token, token.lower())
+        int(token, 16)
 
-        # Validate, sending the right optionValue, expecting a "true" to be returned
-        self.assertTrue(visualCaptcha.validateImage(optionValue))
+        self.assertIsInstance(tokenSource.hexBytes(10), bytes)
 
-    # Should return false if the chosen image option is not the valid one
-    def test_return_false_image(self):
-        global visualCaptcha
+    # Should create different tokens, reading a new block when one runs out
+    def test_unique(self):
+        tokenSource = TokenSource(blockSize=64)
 
-        # Will never match the optionValue
-        optionValue = random.random()
+        tokens = [tokenSource.hex(10) for i in range(100)]
 
-        # Generate option values
-        visualCaptcha.generate()
+        self.assertEqual(len(set(tokens)), 100)
 
-        # Validate, sending the right optionValue, expecting a "false" to be returned
-        self.assertFalse(visualCaptcha.validateImage(optionValue))
+        # Empty tokens are valid, even as the first one of a thread
+        self.assertEqual(TokenSource().hexBytes(0), b'')
 
+        # Tokens bigger than the block are read directly
+        self.assertEqual(len(tokenSource.hexBytes(100)), 200)
 
-# Test validateAudio
-class ValidateAudioTest(unittest.TestCase):
+    # Should give each thread its own block
+    def test_threads(self):
+        tokenSource = TokenSource()
+        tokens = []
 
-    # Runs before each test in this group
-    def setUp(self):
-        globalSetup()
+        def run():
+            for i in range(100):
+                tokens.append(tokenSource.hex(10))
 
-    # Should return true if the chosen audio option is the valid one
-    def test_return_true_audio(self):
-        global visualCaptcha
+        threads = [threading.Thread(target=run) for i in range(4)]
 
-        # Generate option values
-        visualCaptcha.generate()
+        for thread in threads:
+            thread.start()
 
-        optionValue = visualCaptcha.getValidAudioOption()['value']
+        for thread in threads:
+            thread.join()
 
-        # Validate, sending the right optionValue, expecting a "true" to be returned
-        self.assertTrue(visualCaptcha.validateAudio(optionValue))
+        self.assertEqual(len(set(tokens)), 400)
 
-    # Should return false if the chosen audio option is not the valid one
-    def test_return_false_audio(self):
-        global visualCaptcha
+    # Should not give a forked process the same tokens as its parent
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_fork(self):
+        tokenSource = TokenSource()
+        tokenSource.hex(10)
 
-        # Will never match the optionValue
-        optionValue = random.random()
+        readFd, writeFd = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.write(writeFd, tokenSource.hexBytes(10))
+            os._exit(0)
+
+        os.waitpid(pid, 0)
+        childToken = os.read(readFd, 20)
+        os.close(readFd)
+        os.close(writeFd)
+
+        self.assertNotEqual(childToken, tokenSource.hexBytes(10))
+
+    # Should use clean hex field names in the frontend data
+    def test_field_names(self):
+        global visualCaptcha
 
-        # Generate option values
         visualCaptcha.generate()
 
-        # Validate, sending the right optionValue, expecting a "false" to be returned
-        self.assertFalse(visualCaptcha.validateAudio(optionValue))
+        frontendData = visualCaptcha.getFrontendData()
 
+        for value in frontendData['values'] + [frontendData['imageFieldName'], frontendData['audioFieldName']]:
+            self.assertEqual(len(value), 20)
+            int(value, 16)
 
-# Test getImageOptions
-class GetImageOptionsTest(unittest.TestCase):
+
+# Test generateMany
+class GenerateManyTest(unittest.TestCase):
 
     # Runs before each test in this group
     def setUp(self):
         globalSetup()
 
-    # Should return a list with possible image options and the valid image option included
-    def test_return_list_images(self):
+    # Should generate the given number of independent challenges
+    def test_generate_many(self):
         global visualCaptcha
 
-        foundValidOptions = 0
-        numberOfOptions = 4
+        challenges = visualCaptcha.generateMany(10, 6)
 
-        # Generate option values (4)
-        visualCaptcha.generate(numberOfOptions)
+        self.assertEqual(len(challenges), 10)
 
-        # Get the options list
-        options = visualCaptcha.getImageOptions()
+        values = set()
 
-        optionsLength = len(options)
+        for encodedChallenge in challenges:
+            challenge = visualCaptcha.catalog.decodeChallenge(encodedChallenge)
 
-        self.assertEqual(optionsLength, numberOfOptions)
+            self.assertEqual(len(challenge['images']), 6)
+            self.assertIn(challenge['validImageOption'], challenge['images'])
+            self.assertEqual(challenge['frontendData']['imageName'], challenge['validImageOption']['name'])
+            self.assertIn(challenge['validAudioOption'], visualCaptcha.getAllAudioOptions())
 
-        # Loop through all options, and count each time an image was successfully validated
-        for option in options:
-            validationResult = visualCaptcha.validateImage(option['value'])
+            self.assertEqual(len(set(image['path'] for image in challenge['images'])), 6)
+            self.assertEqual(len(challenge['audioNoiseSeed']), 32)
 
-            if (validationResult):
-                foundValidOptions += 1
+            values.update(challenge['frontendData']['values'])
+            values.add(challenge['frontendData']['imageFieldName'])
+            values.add(challenge['frontendData']['audioFieldName'])
+            values.add(challenge['audioNoiseSeed'])
 
-        # We should only find 1 valid option
-        self.assertEqual(foundValidOptions, 1)
+        # All the random values should be different
+        self.assertEqual(len(values), 10 * 9)
+        self.assertEqual(sorted(set(len(value) for value in values)), [20, 32])
+        self.assertEqual(visualCaptcha.generateMany(0), [])
 
-    # Should return a list with all possible image options different
-    def test_return_unique_list(self):
+    # Should validate a challenge once it's attached to the session
+    def test_set_challenge(self):
         global visualCaptcha
 
-        foundSimilarOptions = 0
-        numberOfOptions = 4
+        encodedChallenge = visualCaptcha.generateMany(1)[0]
+        challenge = visualCaptcha.catalog.decodeChallenge(encodedChallenge)
 
-        # Generate option values (4)
-        visualCaptcha.generate(numberOfOptions)
+        visualCaptcha.setChallenge(encodedChallenge)
 
-        # Get the options list
-        options = visualCaptcha.getImageOptions()
+        self.assertEqual(visualCaptcha.getFrontendData(), challenge['frontendData'])
+        self.assertTrue(visualCaptcha.validateImage(challenge['validImageOption']['value']))
+        self.assertTrue(visualCaptcha.validateAudio(challenge['validAudioOption']['value']))
+        self.assertTrue(visualCaptcha.streamImage({}, 0))
 
-        optionsLength = len(options)
+        self.assertRaises(ValueError, visualCaptcha.setChallenge, 'not|a|challenge')
 
-        self.assertEqual(optionsLength, numberOfOptions)
 
-        # Loop through all options, and count each time a duplicate value exists in the array
-        for i in range(0, optionsLength, 1):
-            for j in range(0, optionsLength, 1):
-                if (i != j and options[i]['value'] == options[j]['value']):
-                    foundSimilarOptions += 1
+# Test ChallengePool
+class ChallengePoolTest(unittest.TestCase):
 
-        # We should find no equal options
-        self.assertEqual(foundSimilarOptions, 0)
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
 
-    # Should return the same current image options list, if we don't generate a new valid value
-    def test_return_same_list(self):
+    # Should fill the pool in the background and serve its challenges
+    def test_pool_generate(self):
         global visualCaptcha
 
-        numberOfOptions = 4
+        challengePool = ChallengePool(visualCaptcha.catalog, size=20, lowWater=10, batchSize=5)
+        challengePool.start()
 
-        # Generate option values (4)
-        visualCaptcha.generate(numberOfOptions)
+        for i in range(100):
+            if challengePool.stats()['depth'] == 20:
+                break
+
+            time.sleep(0.01)
+
+        self.assertEqual(challengePool.stats()['depth'], 20)
+
+        visualCaptcha = Captcha(sessionMock, challengePool=challengePool)
+        visualCaptcha.generate()
+
+        challengePool.stop()
+
+        self.assertEqual(challengePool.stats()['served'], 1)
+        self.assertTrue(visualCaptcha.validateImage(visualCaptcha.getValidImageOption()['value']))
+        self.assertTrue(visualCaptcha.streamImage({}, 0))
+
+    # Should generate synchronously when the pool is empty
+    def test_pool_starvation(self):
+        global visualCaptcha
+
+        challengePool = ChallengePool(visualCaptcha.catalog, size=0)
+
+        visualCaptcha = Captcha(sessionMock, challengePool=challengePool)
+        visualCaptcha.generate()
+
+        challengePool.stop()
+
+        self.assertEqual(challengePool.stats()['starvations'], 1)
+        self.assertEqual(len(visualCaptcha.getImageOptions()), 5)
+
+    # Should not start the thread again once stopped, unless started explicitly
+    def test_pool_stop(self):
+        global visualCaptcha
+
+        challengePool = ChallengePool(visualCaptcha.catalog, size=10)
+        challengePool.get()
+        challengePool.stop()
+
+        self.assertIsNone(challengePool.get())
+        self.assertIsNone(challengePool._thread)
+
+        challengePool.start()
+
+        self.assertTrue(challengePool._thread.is_alive())
+
+        challengePool.stop()
+
+    # Should count the failures of the background thread, and keep it running
+    def test_pool_failure(self):
+        global visualCaptcha
+
+        class BrokenCatalog(object):
+
+            def createChallenge(self, numberOfOptions, randomHex):
+                raise ValueError('Sample larger than population')
+
+        challengePool = ChallengePool(BrokenCatalog(), size=10)
+        thread = None
+
+        for i in range(3):
+            challengePool.get()
+
+            for j in range(100):
+                if challengePool.stats()['failures'] > i:
+                    break
+
+                time.sleep(0.01)
+
+            self.assertIs(challengePool._thread, thread or challengePool._thread)
+            thread = challengePool._thread
+
+        self.assertTrue(thread.is_alive())
+        self.assertGreaterEqual(challengePool.stats()['failures'], 3)
+        self.assertEqual(challengePool.stats()['depth'], 0)
+
+        challengePool.stop()
+
+    # Should not use the pool for a different number of options
+    def test_pool_other_options(self):
+        global visualCaptcha
+
+        challengePool = ChallengePool(visualCaptcha.catalog, size=0)
+
+        visualCaptcha = Captcha(sessionMock, challengePool=challengePool)
+        visualCaptcha.generate(6)
+
+        self.assertEqual(challengePool.stats()['starvations'], 0)
+        self.assertEqual(len(visualCaptcha.getImageOptions()), 6)
+
+
+# Test compact sessions
+class CompactSessionTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should only store a short string in the session
+    def test_compact_session(self):
+        session = {}
+        visualCaptcha = Captcha(Session(session), compactSession=True)
+        visualCaptcha.generate()
+
+        self.assertEqual(list(session['visualcaptcha'].keys()), ['challenge'])
+        self.assertTrue(len(session['visualcaptcha']['challenge']) < 250)
+
+    # Should rebuild the same challenge data from the compact session
+    def test_compact_getters(self):
+        session = {}
+        visualCaptcha = Captcha(Session(session), compactSession=True)
+        encodedChallenge = visualCaptcha.generateMany(1)[0]
+        challenge = visualCaptcha.catalog.decodeChallenge(encodedChallenge)
+
+        visualCaptcha.setChallenge(encodedChallenge)
+
+        self.assertEqual(session['visualcaptcha'], {'challenge': encodedChallenge})
+
+        self.assertEqual(visualCaptcha.getImageOptions(), challenge['images'])
+        self.assertEqual(visualCaptcha.getValidImageOption(), challenge['validImageOption'])
+        self.assertEqual(visualCaptcha.getValidAudioOption(), challenge['validAudioOption'])
+        self.assertEqual(visualCaptcha.getFrontendData(), challenge['frontendData'])
+        self.assertEqual(visualCaptcha.getImageOptionAtIndex(1), challenge['images'][1])
+
+    # Should generate, validate and stream with a compact session
+    def test_compact_validate(self):
+        visualCaptcha = Captcha(Session({}), compactSession=True)
+        visualCaptcha.generate()
+
+        firstValue = visualCaptcha.getValidImageOption()['value']
+
+        self.assertTrue(visualCaptcha.validateImage(firstValue))
+        self.assertTrue(visualCaptcha.validateAudio(visualCaptcha.getValidAudioOption()['value']))
+        self.assertTrue(visualCaptcha.streamImage({}, 0))
+        self.assertTrue(visualCaptcha.streamAudio({}))
+
+        visualCaptcha.generate()
+
+        self.assertFalse(visualCaptcha.validateImage(firstValue))
+
+    # Should ignore compact challenges that don't match the catalog
+    def test_compact_invalid(self):
+        visualCaptcha = Captcha(Session({}), compactSession=True)
+        visualCaptcha.session.set('challenge', '1000.2|0|1|a,b|c|d')
+
+        self.assertIsNone(visualCaptcha.getImageOptions())
+        self.assertIsNone(visualCaptcha.getFrontendData())
+
+
+# Test SignedSession
+class SignedSessionTest(unittest.TestCase):
+
+    # Should validate a challenge from a token on another Captcha instance
+    def test_signed_token(self):
+        firstCaptcha = Captcha(SignedSession('secret'), compactSession=True)
+        firstCaptcha.generate()
+
+        token = firstCaptcha.session.dumps()
+        optionValue = firstCaptcha.getValidImageOption()['value']
+
+        secondCaptcha = Captcha(SignedSession('secret', token), compactSession=True)
+
+        self.assertEqual(secondCaptcha.getFrontendData(), firstCaptcha.getFrontendData())
+        self.assertTrue(secondCaptcha.streamImage({}, 0))
+        self.assertTrue(secondCaptcha.validateImage(optionValue))
+
+    # Should keep the same audio noise for every request with the same token
+    def test_signed_audio_noise(self):
+        visualCaptcha = Captcha(SignedSession('secret'), compactSession=True)
+        visualCaptcha.generate()
+
+        token = visualCaptcha.session.dumps()
+
+        firstContent = Captcha(SignedSession('secret', token), compactSession=True).streamAudio({})
+        secondContent = Captcha(SignedSession('secret', token), compactSession=True).streamAudio({})
+
+        self.assertEqual(firstContent, secondContent)
+
+    # Should not give away the answers, or the options they can be found from, to anyone without the secret
+    def test_encrypted_token(self):
+        for compactSession in (False, True):
+            visualCaptcha = Captcha(SignedSession('secret'), compactSession=compactSession)
+            visualCaptcha.generate()
+
+            token = visualCaptcha.session.dumps()
+            payload = visualCaptcha.session.utilDecode(token.split('.')[0])
+
+            # Audio answers can be a single digit, found anywhere by chance, so the longer strings are checked
+            for value in (visualCaptcha.getValidImageOption()['value'], visualCaptcha.getValidImageOption()['path'],
+                          visualCaptcha.getValidAudioOption()['path'], visualCaptcha.session.get('challenge') or 'validAudioOption'):
+                self.assertNotIn(value.encode('utf-8'), payload)
+                self.assertNotIn(value.encode('utf-8'), base64.b64encode(payload))
+
+            # The same state gives a different token each time
+            visualCaptcha.session.token = None
+
+            self.assertNotEqual(visualCaptcha.session.dumps().split('.')[0], token.split('.')[0])
+
+    # Should reject tokens with a wrong signature or expired
+    def test_invalid_tokens(self):
+        session = SignedSession('secret')
+        session.set('test', 'awesome')
+
+        token = session.dumps()
+
+        self.assertEqual(SignedSession('secret', token).get('test'), 'awesome')
+        self.assertIsNone(SignedSession('other', token).get('test'))
+        self.assertIsNone(SignedSession('secret', 'x' + token).get('test'))
+        self.assertIsNone(SignedSession('secret', 'invalid').get('test'))
+
+        session = SignedSession('secret', None, -1)
+        session.set('test', 'awesome')
+
+        self.assertIsNone(SignedSession('secret', session.dumps()).get('test'))
+
+    # Should only validate each token once with a replay cache
+    def test_replay_cache(self):
+        replayCache = MemoryReplayCache()
+
+        visualCaptcha = Captcha(SignedSession('secret'), compactSession=True)
+        visualCaptcha.generate()
+
+        token = visualCaptcha.session.dumps()
+        optionValue = visualCaptcha.getValidAudioOption()['value']
+
+        self.assertTrue(Captcha(SignedSession('secret', token, replayCache=replayCache), compactSession=True).validateAudio(optionValue))
+        self.assertFalse(Captcha(SignedSession('secret', token, replayCache=replayCache), compactSession=True).validateAudio(optionValue))
+
+
+# Test session backends
+class SessionBackendTest(unittest.TestCase):
+
+    # Should get, set and delete keys
+    def test_memory_backend(self):
+        backend = MemoryBackend()
+
+        backend.set('first', {'test': 'awesome'})
+        backend.setMany({'second': [1, 2], 'third': 'three'})
+
+        self.assertEqual(backend.get('first'), {'test': 'awesome'})
+        self.assertEqual(backend.getMany(['second', 'third', 'missing']), {'second': [1, 2], 'third': 'three'})
+
+        backend.delete('second')
+
+        self.assertIsNone(backend.get('second'))
+        self.assertEqual(backend.getAndDelete('third'), 'three')
+        self.assertIsNone(backend.getAndDelete('third'))
+
+    # Should expire keys after their TTL
+    def test_memory_backend_ttl(self):
+        backend = MemoryBackend()
+
+        backend.set('first', 'one', 0.05)
+        backend.set('second', 'two')
+
+        self.assertEqual(backend.get('first'), 'one')
+
+        time.sleep(0.1)
+
+        self.assertIsNone(backend.get('first'))
+        self.assertEqual(backend.get('second'), 'two')
+
+    # Should store the challenge in the backend, and share it between sessions
+    def test_backend_session(self):
+        backend = MemoryBackend()
+
+        visualCaptcha = Captcha(BackendSession(backend, 'user'))
+        visualCaptcha.generate()
+
+        optionValue = visualCaptcha.getValidImageOption()['value']
+
+        secondCaptcha = Captcha(BackendSession(backend, 'user'))
+
+        self.assertEqual(secondCaptcha.getFrontendData(), visualCaptcha.getFrontendData())
+        self.assertTrue(secondCaptcha.streamImage({}, 0))
+        self.assertIsNone(Captcha(BackendSession(backend, 'other')).getFrontendData())
+
+        # The challenge can only be validated once
+        self.assertTrue(secondCaptcha.validateImage(optionValue))
+        self.assertFalse(Captcha(BackendSession(backend, 'user')).validateImage(optionValue))
+
+    # Should not validate a challenge loaded before it was validated, nor remove the challenge generated since
+    def test_backend_session_stale(self):
+        backend = MemoryBackend()
+
+        for compactSession in (False, True):
+            Captcha(BackendSession(backend, 'user'), compactSession=compactSession).generate()
+
+            firstRequest = Captcha(BackendSession(backend, 'user'), compactSession=compactSession)
+            secondRequest = Captcha(BackendSession(backend, 'user'), compactSession=compactSession)
+            optionValue = firstRequest.getValidImageOption()['value']
+
+            self.assertEqual(secondRequest.getValidImageOption()['value'], optionValue)
+            self.assertTrue(firstRequest.validateImage(optionValue))
+
+            newCaptcha = Captcha(BackendSession(backend, 'user'), compactSession=compactSession)
+            newCaptcha.generate()
+
+            newOptionValue = newCaptcha.getValidImageOption()['value']
+
+            self.assertFalse(secondRequest.validateImage(optionValue))
+            self.assertTrue(Captcha(BackendSession(backend, 'user'), compactSession=compactSession).validateImage(newOptionValue))
+
+    # Should allow validating many times if not single use
+    def test_backend_session_reuse(self):
+        backend = MemoryBackend()
+
+        visualCaptcha = Captcha(BackendSession(backend, 'user', singleUse=False))
+        visualCaptcha.generate()
+
+        optionValue = visualCaptcha.getValidAudioOption()['value']
+
+        self.assertTrue(visualCaptcha.validateAudio(optionValue))
+        self.assertTrue(Captcha(BackendSession(backend, 'user', singleUse=False)).validateAudio(optionValue))
+
+    # Should send the Redis commands with the prefix and TTL, in a single round-trip for setMany and getMany
+    def test_redis_backend(self):
+        client = FakeRedis()
+        backend = RedisBackend(prefix='test:', client=client)
+
+        backend.setMany({'first': {'test': 'awesome'}, 'second': [1, 2]}, 60)
+
+        # Dictionaries aren't ordered before Python 3.7, so the commands are sorted
+        self.assertEqual(len(client.roundTrips), 1)
+        self.assertEqual(client.roundTrips[0][:2], ('pipeline', True))
+        self.assertEqual(sorted(client.roundTrips[0][2]), [
+            ('set', 'test:first', '{"test": "awesome"}', 60),
+            ('set', 'test:second', '[1, 2]', 60)
+        ])
+
+        client.roundTrips = []
+        backend.set('third', 'three')
+
+        self.assertEqual(backend.getMany(['first', 'missing', 'third']), {'first': {'test': 'awesome'}, 'third': 'three'})
+        self.assertEqual(client.roundTrips, [('set', 'test:third', '"three"', None), ('mget', ['test:first', 'test:missing', 'test:third'])])
+
+        backend.delete('third')
+
+        self.assertIsNone(backend.get('third'))
+        self.assertEqual(backend.get('second'), [1, 2])
+
+    # Should get and delete the key in a single transaction
+    def test_redis_get_and_delete(self):
+        client = FakeRedis()
+        backend = RedisBackend(client=client)
+
+        visualCaptcha = Captcha(BackendSession(backend, 'user'))
+        visualCaptcha.generate()
+
+        self.assertEqual([roundTrip[0] for roundTrip in client.roundTrips], ['get', 'set'])
+
+        optionValue = visualCaptcha.getValidImageOption()['value']
+        client.roundTrips = []
+
+        self.assertTrue(Captcha(BackendSession(backend, 'user')).validateImage(optionValue))
+        self.assertEqual(client.roundTrips[-1], ('pipeline', True, [('get', 'visualcaptcha:visualcaptcha:user'), ('delete', 'visualcaptcha:visualcaptcha:user')]))
+        self.assertIsNone(backend.getAndDelete('visualcaptcha:user'))
+        self.assertNotIn('visualcaptcha:visualcaptcha:user', client.values)
+
+
+# Redis client stand-in, recording each command or pipeline sent to the server
+class FakeRedis(object):
+
+    def __init__(self):
+        self.values = {}
+        self.roundTrips = []
+
+    def get(self, key):
+        self.roundTrips.append(('get', key))
+
+        return self.utilGet(key)
+
+    def set(self, key, value, ex=None):
+        self.roundTrips.append(('set', key, value, ex))
+        self.values[key] = value.encode('utf-8')
+
+    def mget(self, keys):
+        self.roundTrips.append(('mget', keys))
+
+        return [self.utilGet(key) for key in keys]
+
+    def delete(self, key):
+        self.roundTrips.append(('delete', key))
+        self.values.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self, transaction)
+
+    # Redis returns bytes
+    def utilGet(self, key):
+        return self.values.get(key)
+
+
+class FakeRedisPipeline(object):
+
+    def __init__(self, client, transaction):
+        self.client = client
+        self.transaction = transaction
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(('get', key))
+
+    def set(self, key, value, ex=None):
+        self.commands.append(('set', key, value, ex))
+
+    def delete(self, key):
+        self.commands.append(('delete', key))
+
+    # All the commands are sent at once, and run one after the other without any other client's commands in between
+    def execute(self):
+        self.client.roundTrips.append(('pipeline', self.transaction, self.commands))
+        results = []
+
+        for command in self.commands:
+            if command[0] == 'get':
+                results.append(self.client.utilGet(command[1]))
+            elif command[0] == 'set':
+                self.client.values[command[1]] = command[2].encode('utf-8')
+                results.append(True)
+            else:
+                results.append(int(self.client.values.pop(command[1], None) is not None))
+
+        return results
+
+
+# Session backend counting the calls made to it
+class CountingBackend(MemoryBackend):
+
+    def __init__(self):
+        MemoryBackend.__init__(self)
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append('get')
+        return MemoryBackend.get(self, key)
+
+    def set(self, key, value, ttl=None):
+        self.calls.append('set')
+        return MemoryBackend.set(self, key, value, ttl)
+
+    def delete(self, key):
+        self.calls.append('delete')
+        return MemoryBackend.delete(self, key)
+
+
+# Test session commits
+class SessionCommitTest(unittest.TestCase):
+
+    # Should replace all the data in the namespace
+    def test_session_commit(self):
+        session = Session()
+        session.set('test', 'awesome')
+        session.commit({'other': 'value'})
+
+        self.assertIsNone(session.get('test'))
+        self.assertEqual(session.get('other'), 'value')
+
+    # Should write the generated challenge with a single backend call
+    def test_generate_single_write(self):
+        backend = CountingBackend()
+
+        visualCaptcha = Captcha(BackendSession(backend, 'user'))
+        visualCaptcha.generate()
+
+        self.assertEqual(backend.calls, ['get', 'set'])
+
+        visualCaptcha.generate()
+
+        self.assertEqual(backend.calls, ['get', 'set', 'set'])
+        self.assertTrue(Captcha(BackendSession(backend, 'user')).streamImage({}, 0))
+
+    # Should write the whole challenge to the session at once
+    def test_generate_commit(self):
+        session = {}
+
+        visualCaptcha = Captcha(Session(session))
+        visualCaptcha.generate()
+
+        firstNamespace = session['visualcaptcha']
+
+        visualCaptcha.generate()
+
+        self.assertIsNot(session['visualcaptcha'], firstNamespace)
+        self.assertEqual(sorted(session['visualcaptcha'].keys()), ['audioNoiseSeed', 'frontendData', 'images', 'validAudioOption', 'validImageOption'])
+
+
+# AsyncCaptcha needs Python 3.7, and its tests use async syntax older versions can't parse
+if sys.version_info >= (3, 7):
+    from testasync import AsyncCaptchaTests
+
+    # Test AsyncCaptcha
+    class AsyncCaptchaTest(AsyncCaptchaTests, unittest.TestCase):
+        pass
+
+
+# Test generating from many threads at once
+class ThreadSafetyTest(unittest.TestCase):
+
+    # Should never mix the values of challenges generated concurrently
+    def test_concurrent_generate(self):
+        catalogOptions = [dict(option) for option in Captcha(Session({})).getAllImageOptions()]
+        sessions = [{} for i in range(8)]
+        errors = []
+        allValues = []
+
+        def run(session):
+            visualCaptcha = Captcha(Session(session))
+
+            for i in range(200):
+                visualCaptcha.generate()
+
+                frontendData = visualCaptcha.getFrontendData()
+                images = visualCaptcha.getImageOptions()
+                validImageOption = visualCaptcha.getValidImageOption()
+
+                # The valid option and the values must all belong to this challenge
+                if ([image['value'] for image in images] != frontendData['values'] or validImageOption not in images or validImageOption['name'] != frontendData['imageName']):
+                    errors.append(frontendData)
+
+                allValues.extend(frontendData['values'])
+
+        threads = [threading.Thread(target=run, args=(session,)) for session in sessions]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        # No value was given to two images
+        self.assertEqual(len(set(allValues)), 8 * 200 * 5)
+
+        # The shared catalog wasn't changed
+        self.assertEqual([dict(option) for option in Captcha(Session({})).getAllImageOptions()], catalogOptions)
+
+    # Should serve each pooled challenge only once
+    def test_concurrent_pool(self):
+        challengePool = ChallengePool(Catalog.load(), size=200, lowWater=100, batchSize=50)
+        challenges = []
+
+        def run():
+            for i in range(100):
+                challenge = challengePool.get()
+
+                if challenge is not None:
+                    challenges.append(challenge)
+
+        threads = [threading.Thread(target=run) for i in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        challengePool.stop()
+
+        # The challenges are kept in the list, so their ids can't be reused
+        self.assertEqual(len(set(id(challenge) for challenge in challenges)), len(challenges))
+        self.assertEqual(challengePool.stats()['served'], len(challenges))
+        self.assertEqual(challengePool.stats()['served'] + challengePool.stats()['starvations'], 800)
+
+
+# Test validateImage
+class ValidateImageTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should return true if the chosen image option is the valid one
+    def test_return_true_image(self):
+        global visualCaptcha
+
+        # Generate option values
+        visualCaptcha.generate()
+
+        optionValue = visualCaptcha.getValidImageOption()['value']
+
+        # Validate, sending the right optionValue, expecting a "true" to be returned
+        self.assertTrue(visualCaptcha.validateImage(optionValue))
+
+    # Should return false if the chosen image option is not the valid one
+    def test_return_false_image(self):
+        global visualCaptcha
+
+        # Will never match the optionValue
+        optionValue = random.random()
+
+        # Generate option values
+        visualCaptcha.generate()
+
+        # Validate, sending the right optionValue, expecting a "false" to be returned
+        self.assertFalse(visualCaptcha.validateImage(optionValue))
+
+
+# Test validateAudio
+class ValidateAudioTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should return true if the chosen audio option is the valid one
+    def test_return_true_audio(self):
+        global visualCaptcha
+
+        # Generate option values
+        visualCaptcha.generate()
+
+        optionValue = visualCaptcha.getValidAudioOption()['value']
+
+        # Validate, sending the right optionValue, expecting a "true" to be returned
+        self.assertTrue(visualCaptcha.validateAudio(optionValue))
+
+    # Should return false if the chosen audio option is not the valid one
+    def test_return_false_audio(self):
+        global visualCaptcha
+
+        # Will never match the optionValue
+        optionValue = random.random()
+
+        # Generate option values
+        visualCaptcha.generate()
+
+        # Validate, sending the right optionValue, expecting a "false" to be returned
+        self.assertFalse(visualCaptcha.validateAudio(optionValue))
+
+
+# Test getImageOptions
+class GetImageOptionsTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should return a list with possible image options and the valid image option included
+    def test_return_list_images(self):
+        global visualCaptcha
+
+        foundValidOptions = 0
+        numberOfOptions = 4
+
+        # Generate option values (4)
+        visualCaptcha.generate(numberOfOptions)
+
+        # Get the options list
+        options = visualCaptcha.getImageOptions()
+
+        optionsLength = len(options)
+
+        self.assertEqual(optionsLength, numberOfOptions)
+
+        # Loop through all options, and count each time an image was successfully validated
+        for option in options:
+            validationResult = visualCaptcha.validateImage(option['value'])
+
+            if (validationResult):
+                foundValidOptions += 1
+
+        # We should only find 1 valid option
+        self.assertEqual(foundValidOptions, 1)
+
+    # Should return a list with all possible image options different
+    def test_return_unique_list(self):
+        global visualCaptcha
+
+        foundSimilarOptions = 0
+        numberOfOptions = 4
+
+        # Generate option values (4)
+        visualCaptcha.generate(numberOfOptions)
+
+        # Get the options list
+        options = visualCaptcha.getImageOptions()
+
+        optionsLength = len(options)
+
+        self.assertEqual(optionsLength, numberOfOptions)
+
+        # Loop through all options, and count each time a duplicate value exists in the array
+        for i in range(0, optionsLength, 1):
+            for j in range(0, optionsLength, 1):
+                if (i != j and options[i]['value'] == options[j]['value']):
+                    foundSimilarOptions += 1
+
+        # We should find no equal options
+        self.assertEqual(foundSimilarOptions, 0)
+
+    # Should return the same current image options list, if we don't generate a new valid value
+    def test_return_same_list(self):
+        global visualCaptcha
+
+        numberOfOptions = 4
+
+        # Generate option values (4)
+        visualCaptcha.generate(numberOfOptions)
 
         # Get the first options list
         firstOptions = visualCaptcha.getImageOptions()
@@ -482,6 +1716,83 @@ class GetAudioOptionTest(unittest.TestCase):
         self.assertEqual(firstOption['value'], thirdOption['value'])
 
 
+# Test Manifest
+class ManifestTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+        self.manifestPath = os.path.dirname(os.path.realpath(__file__)) + '/test_manifest.json'
+
+    # Runs after each test in this group
+    def tearDown(self):
+        if os.path.isfile(self.manifestPath):
+            os.remove(self.manifestPath)
+
+    # Should find every variant of the bundled options
+    def test_compile(self):
+        global assetsFullPath
+
+        manifest = Manifest.compile()
+
+        self.assertEqual(manifest.missing, [])
+        self.assertEqual(manifest.getImagePath('airplane.png', True), assetsFullPath + '/images/airplane@2x.png')
+        self.assertEqual(manifest.getAudioPath('5times2.mp3', 'ogg'), assetsFullPath + '/audios/5times2.ogg')
+
+        fileEntry = manifest.getFile(assetsFullPath + '/images/airplane.png')
+
+        self.assertEqual(fileEntry['size'], os.path.getsize(assetsFullPath + '/images/airplane.png'))
+        self.assertEqual(fileEntry['mimeType'], 'image/png')
+        self.assertEqual(len(fileEntry['hash']), 64)
+
+    # Should report the missing variants
+    def test_missing(self):
+        manifest = Manifest.compile('', [{'name': 'Test', 'path': 'test.png'}])
+
+        self.assertEqual(manifest.missing, ['images/test.png', 'images/test@2x.png'])
+        self.assertIsNone(manifest.getImagePath('test.png'))
+
+    # Should stream the files found in a saved manifest
+    def test_stream(self):
+        Manifest.compile().save(self.manifestPath)
+
+        manifest = Manifest.load(self.manifestPath)
+        visualCaptcha = Captcha(Session({}), manifest=manifest)
+        visualCaptcha.generate()
+
+        headers = {}
+
+        self.assertTrue(visualCaptcha.streamImage(headers, 0, True))
+        self.assertEqual(headers['Content-Type'], 'image/png')
+        self.assertTrue(visualCaptcha.getImageFilePath(0, True).endswith('@2x.png'))
+
+        stream = visualCaptcha.streamAudio(headers, 'ogg', True)
+
+        self.assertEqual(headers['Content-Type'], 'audio/ogg')
+        self.assertEqual(len(b''.join(stream)), len(stream))
+
+        # Other file types get the mp3 file, like without a manifest
+        for fileType in ('MP3', 'wav'):
+            self.assertEqual(visualCaptcha.getAudioFilePath(fileType), Captcha(visualCaptcha.session).getAudioFilePath(fileType))
+            self.assertEqual(visualCaptcha.streamAudio(headers, fileType), visualCaptcha.streamAudio({}, 'mp3'))
+
+    # Should compile a manifest from the command line
+    def test_main(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+
+        try:
+            status = Manifest.main(['--output', self.manifestPath])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(status, 0)
+        self.assertEqual(output, '%d files written to %s\n' % (len(Manifest.load(self.manifestPath).files), os.path.abspath(self.manifestPath)))
+        self.assertEqual(Manifest.load(self.manifestPath).missing, [])
+
+
 # Test streamImage
 class StreamImageTest(unittest.TestCase):
 
@@ -529,6 +1840,110 @@ class StreamImageTest(unittest.TestCase):
         self.assertFalse(fileReturn)
 
 
+# Test streamImageBundle
+class StreamImageBundleTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should stream all the images, each with its length and its own noise
+    def test_stream_bundle(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        headers = {}
+        content = visualCaptcha.streamImageBundle(headers)
+
+        self.assertEqual(headers['Content-Length'], str(len(content)))
+
+        offset = 0
+
+        for index in range(5):
+            length = int(binascii.hexlify(content[offset:offset + 4]), 16)
+            imageContent = content[offset + 4:offset + 4 + length]
+
+            with open(visualCaptcha.getImageFilePath(index), 'rb') as f:
+                fileContent = f.read()
+
+            self.assertTrue(imageContent.startswith(fileContent))
+            self.assertTrue(length - len(fileContent) <= 3000)
+
+            offset += 4 + length
+
+        self.assertEqual(offset, len(content))
+
+    # Should fail to stream a bundle before the options are generated
+    def test_stream_bundle_not_generated(self):
+        global visualCaptcha
+
+        self.assertFalse(visualCaptcha.streamImageBundle({}))
+
+
+# Test getInlineFrontendData
+class InlineFrontendDataTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Check the data URIs hold the images followed by their noise
+    def checkImageData(self, visualCaptcha, inlineFrontendData):
+        self.assertEqual(inlineFrontendData['values'], visualCaptcha.getFrontendData()['values'])
+        self.assertEqual(len(inlineFrontendData['imageData']), 5)
+
+        for index, dataUri in enumerate(inlineFrontendData['imageData']):
+            prefix = 'data:image/png;base64,'
+
+            self.assertTrue(dataUri.startswith(prefix))
+
+            content = base64.b64decode(dataUri[len(prefix):])
+
+            with open(visualCaptcha.getImageFilePath(index), 'rb') as f:
+                fileContent = f.read()
+
+            self.assertTrue(content.startswith(fileContent))
+            self.assertTrue(len(content) - len(fileContent) <= 3000)
+
+    # Should add the images as data URIs
+    def test_inline(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        self.checkImageData(visualCaptcha, visualCaptcha.getInlineFrontendData())
+        self.assertNotIn('imageData', visualCaptcha.getFrontendData())
+
+    # Should encode the noise separately from the cached encoding of the file
+    def test_inline_asset_cache(self):
+        assetCache = AssetCache()
+        visualCaptcha = Captcha(Session({}), assetCache=assetCache)
+        visualCaptcha.generate()
+
+        self.checkImageData(visualCaptcha, visualCaptcha.getInlineFrontendData())
+        self.checkImageData(visualCaptcha, visualCaptcha.getInlineFrontendData())
+
+        # The encodings are counted in the cache size
+        self.assertTrue(assetCache.stats()['size'] > 5 * 4 / 3.0 * 1000)
+
+        assetCache.clear()
+        self.assertEqual(assetCache.stats()['size'], 0)
+
+    # Should encode noisy variants
+    def test_inline_noise_variants(self):
+        visualCaptcha = Captcha(Session({}), noiseVariants=NoiseVariants())
+        visualCaptcha.generate()
+
+        self.checkImageData(visualCaptcha, visualCaptcha.getInlineFrontendData())
+
+    # Should return None before the options are generated
+    def test_inline_not_generated(self):
+        global visualCaptcha
+
+        self.assertIsNone(visualCaptcha.getInlineFrontendData())
+
+
 # Test streamAudio
 class StreamAudioTest(unittest.TestCase):
 
@@ -572,6 +1987,341 @@ class StreamAudioTest(unittest.TestCase):
         # Check if the audio failed streaming
         self.assertFalse(fileReturn)
 
+# Test streamed responses
+class StreamedTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should stream an image file in chunks, followed by the noise
+    def test_streamed_image(self):
+        global visualCaptcha, assetsFullPath
+
+        visualCaptcha.generate()
+
+        headers = {}
+        stream = visualCaptcha.streamImage(headers, 0, False, True)
+        imagePath = assetsFullPath + '/images/' + visualCaptcha.getImageOptionAtIndex(0)['path']
+
+        content = b''.join(bytes(chunk) for chunk in stream)
+
+        with open(imagePath, 'rb') as f:
+            self.assertTrue(content.startswith(f.read()))
+
+        self.assertEqual(len(content), len(stream))
+        self.assertEqual(headers['Content-Length'], str(len(stream)))
+        self.assertEqual(content[stream.fileSize:], stream.noise)
+
+    # Should stream cached files without copying them
+    def test_streamed_cached_audio(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+        visualCaptcha = Captcha(Session({}), False, False, False, assetCache)
+        visualCaptcha.generate()
+
+        stream = visualCaptcha.streamAudio({}, 'ogg', True)
+        chunks = list(stream)
+
+        self.assertIs(chunks[0], assetCache.get(visualCaptcha.getAudioFilePath('ogg')))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(stream))
+
+        # Partial chunks are still bytes, as WSGI servers require
+        for chunk in visualCaptcha.streamAudio({}, 'ogg', True, 'bytes=10-20000'):
+            self.assertIsInstance(chunk, bytes)
+
+    # Should send the file and the noise to a socket
+    def test_streamed_sendfile(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        stream = visualCaptcha.streamAudio({}, 'mp3', True)
+        sender, receiver = socket.socketpair()
+        received = []
+
+        reader = threading.Thread(target=lambda: received.append(receiver.makefile('rb').read()))
+        reader.start()
+
+        stream.sendfile(sender)
+        sender.close()
+        reader.join()
+        receiver.close()
+
+        self.assertEqual(len(received[0]), len(stream))
+        self.assertTrue(received[0].endswith(stream.noise))
+
+    # Should fail to stream an undefined image
+    def test_streamed_undefined_index(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        self.assertFalse(visualCaptcha.streamImage({}, 100, False, True))
+
+# Test range requests for streamAudio
+class StreamAudioRangeTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should return the same audio noise for every request of the same challenge
+    def test_consistent_noise(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        headers = {}
+        firstContent = visualCaptcha.streamAudio(headers)
+        secondContent = visualCaptcha.streamAudio({})
+
+        self.assertEqual(firstContent, secondContent)
+        self.assertEqual(headers['Accept-Ranges'], 'bytes')
+        self.assertNotIn('Content-Range', headers)
+
+        # A new challenge gets new noise
+        visualCaptcha.generate()
+        thirdContent = visualCaptcha.streamAudio({}, 'mp3')
+
+        self.assertNotEqual(firstContent, thirdContent)
+
+    # Should return partial content matching the full response
+    def test_range(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        fullContent = visualCaptcha.streamAudio({}, 'ogg')
+        totalLength = len(fullContent)
+
+        for rangeHeader, start, end in (
+            ('bytes=0-99', 0, 99),
+            ('bytes=100-', 100, totalLength - 1),
+            ('bytes=-50', totalLength - 50, totalLength - 1),
+            ('bytes=%d-%d' % (totalLength - 10, totalLength + 10), totalLength - 10, totalLength - 1)
+        ):
+            headers = {}
+            content = visualCaptcha.streamAudio(headers, 'ogg', False, rangeHeader)
+
+            self.assertEqual(content, fullContent[start:end + 1])
+            self.assertEqual(headers['Content-Range'], 'bytes %d-%d/%d' % (start, end, totalLength))
+            self.assertEqual(headers['Content-Length'], str(end - start + 1))
+
+            stream = visualCaptcha.streamAudio({}, 'ogg', True, rangeHeader)
+
+            self.assertEqual(b''.join(bytes(chunk) for chunk in stream), fullContent[start:end + 1])
+
+    # Should give the same noise to parallel requests that loaded the session before any audio was streamed
+    def test_parallel_ranges(self):
+        for compactSession in (False, True):
+            session = {}
+            Captcha(Session(session), compactSession=compactSession).generate()
+
+            firstCaptcha = Captcha(Session(copy.deepcopy(session)), compactSession=compactSession)
+            secondCaptcha = Captcha(Session(copy.deepcopy(session)), compactSession=compactSession)
+
+            firstHeaders = {}
+            secondHeaders = {}
+            firstContent = firstCaptcha.streamAudio(firstHeaders, 'mp3', False, 'bytes=0-99')
+            secondContent = secondCaptcha.streamAudio(secondHeaders, 'mp3', False, 'bytes=100-')
+
+            self.assertEqual(firstHeaders['Content-Range'].split('/')[1], secondHeaders['Content-Range'].split('/')[1])
+            self.assertEqual(firstContent + secondContent, Captcha(Session(session), compactSession=compactSession).streamAudio({}))
+
+            # Streaming only reads the session
+            self.assertEqual(Session(session).get('audioNoiseSeed') is not None, not compactSession)
+            self.assertEqual(firstCaptcha.session.session, session)
+
+        # Compact challenges encoded without a seed get random noise, without ranges
+        encodedChallenge = session['visualcaptcha']['challenge'].rsplit('|', 1)[0]
+        headers = {}
+
+        self.assertIsNone(firstCaptcha.catalog.decodeChallenge(encodedChallenge)['audioNoiseSeed'])
+
+        firstCaptcha.session.set('challenge', encodedChallenge)
+
+        self.assertTrue(firstCaptcha.streamAudio(headers, 'mp3', False, 'bytes=0-99'))
+        self.assertNotIn('Content-Range', headers)
+
+    # Should ignore invalid and unsatisfiable ranges
+    def test_invalid_range(self):
+        global visualCaptcha
+
+        visualCaptcha.generate()
+
+        fullContent = visualCaptcha.streamAudio({})
+
+        for rangeHeader in ('bytes=0-1,5-6', 'bytes=-', 'items=0-1', 'bytes=%d-' % len(fullContent)):
+            headers = {}
+
+            self.assertEqual(visualCaptcha.streamAudio(headers, 'mp3', False, rangeHeader), fullContent)
+            self.assertNotIn('Content-Range', headers)
+
+# Test noisy variants
+class NoiseVariantsTest(unittest.TestCase):
+
+    # Runs before each test in this group
+    def setUp(self):
+        globalSetup()
+
+    # Should stream one of the precomputed variants of an image
+    def test_stream_variant(self):
+        noiseVariants = NoiseVariants(count=3)
+        visualCaptcha = Captcha(Session({}), noiseVariants=noiseVariants)
+        visualCaptcha.generate()
+
+        with open(visualCaptcha.getImageFilePath(0), 'rb') as f:
+            fileContent = f.read()
+
+        headers = {}
+        contents = set()
+
+        for i in range(50):
+            content = visualCaptcha.streamImage(headers, 0)
+
+            self.assertTrue(content.startswith(fileContent))
+            self.assertTrue(len(content) <= len(fileContent) + 3000)
+            contents.add(content)
+
+        self.assertEqual(headers['Content-Type'], 'image/png')
+        self.assertTrue(len(contents) <= 3)
+        self.assertEqual(noiseVariants.stats()['rotations'], 1)
+
+        # Streamed variants are sent whole, without being copied
+        stream = visualCaptcha.streamImage(headers, 0, streamed=True)
+
+        self.assertIn(b''.join(stream), contents)
+        self.assertEqual(headers['Content-Length'], str(len(stream)))
+
+    # Should replace the variants once they expire
+    def test_rotate(self):
+        noiseVariants = NoiseVariants(count=2, rotateSeconds=0)
+        visualCaptcha = Captcha(Session({}), noiseVariants=noiseVariants)
+        visualCaptcha.generate()
+
+        visualCaptcha.streamImage({}, 0)
+        time.sleep(0.01)
+        visualCaptcha.streamImage({}, 0)
+
+        self.assertEqual(noiseVariants.stats()['rotations'], 2)
+
+    # Should evict the least recently used files above maxBytes
+    def test_max_bytes(self):
+        noiseVariants = NoiseVariants(count=2, maxBytes=20000)
+        readFile = lambda filePath: filePath.encode('ascii') * 1000
+
+        for filePath in ('first', 'second', 'third'):
+            self.assertTrue(noiseVariants.get(filePath, readFile).startswith(readFile(filePath)))
+
+        stats = noiseVariants.stats()
+
+        self.assertEqual(stats['files'], 1)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertTrue(0 < stats['size'] <= 20000)
+
+        self.assertTrue(NoiseVariants(maxBytes=10).get('first', readFile).startswith(readFile('first')))
+
+    # Should let a single thread rotate an expired file, while the others send the old variants
+    def test_single_rotation(self):
+        noiseVariants = NoiseVariants(count=2, rotateSeconds=0)
+        reads = []
+
+        def readFile(filePath):
+            reads.append(filePath)
+            time.sleep(0.1)
+
+            return b'content'
+
+        noiseVariants.get('file', readFile)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(noiseVariants.get('file', readFile))) for i in range(5)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result.startswith(b'content') for result in results))
+        self.assertEqual(noiseVariants.stats()['rotations'], 2)
+
+    # Should fail to find an image file, and keep the audio noise stable for ranges
+    def test_missing_and_audio(self):
+        visualCaptcha = Captcha(Session({}), noiseVariants=NoiseVariants())
+        visualCaptcha.generate()
+
+        self.assertFalse(visualCaptcha.streamImage({}, 100))
+        self.assertEqual(visualCaptcha.streamAudio({}), visualCaptcha.streamAudio({}))
+
+
+# Test Metrics
+class MetricsTest(unittest.TestCase):
+
+    # Should record the Captcha calls
+    def test_captcha_metrics(self):
+        metrics = Metrics()
+        assetCache = AssetCache()
+        metrics.addCache(assetCache)
+
+        visualCaptcha = Captcha(BackendSession(InstrumentedBackend(MemoryBackend(), metrics), 'user'), assetCache=assetCache, metrics=metrics)
+        visualCaptcha.generate()
+
+        image = visualCaptcha.streamImage({}, 0)
+        visualCaptcha.streamImage({}, 100)
+        visualCaptcha.streamAudio({})
+        visualCaptcha.validateImage('wrong')
+
+        exposition = metrics.exposition()
+
+        self.assertIn('# TYPE visualcaptcha_generate_seconds histogram', exposition)
+        self.assertIn('visualcaptcha_generate_seconds_count 1', exposition)
+        self.assertIn('visualcaptcha_stream_seconds_count{type="image"} 2', exposition)
+        self.assertIn('visualcaptcha_stream_seconds_count{type="audio"} 1', exposition)
+        self.assertIn('visualcaptcha_stream_not_found_total{type="image"} 1', exposition)
+        self.assertIn('visualcaptcha_bytes_served_total{type="image"} %d' % len(image), exposition)
+        self.assertIn('visualcaptcha_validations_total{result="failure",type="image"} 1', exposition)
+        self.assertIn('visualcaptcha_cache_misses_total{cache="asset"} 2', exposition)
+        self.assertIn('visualcaptcha_session_backend_seconds_count{method="getAndDelete"} 1', exposition)
+
+    # Should count the histogram buckets cumulatively
+    def test_histogram(self):
+        metrics = Metrics(buckets=[0.1, 1])
+
+        metrics.observe('test_seconds', 0.05)
+        metrics.observe('test_seconds', 0.5)
+        metrics.observe('test_seconds', 5)
+
+        exposition = metrics.exposition()
+
+        self.assertIn('visualcaptcha_test_seconds_bucket{le="0.1"} 1', exposition)
+        self.assertIn('visualcaptcha_test_seconds_bucket{le="1"} 2', exposition)
+        self.assertIn('visualcaptcha_test_seconds_bucket{le="+Inf"} 3', exposition)
+        self.assertIn('visualcaptcha_test_seconds_sum 5.55', exposition)
+        self.assertIn('visualcaptcha_test_seconds_count 3', exposition)
+
+    # Should serve the metrics over HTTP
+    def test_serve(self):
+        metrics = Metrics()
+        metrics.inc('test_total')
+
+        server = metrics.serve(port=0)
+
+        try:
+            connection = HTTPConnection('127.0.0.1', server.server_address[1])
+            connection.request('GET', '/metrics')
+            content = connection.getresponse().read().decode('utf-8')
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertIn('visualcaptcha_test_total 1', content)
+
+
 if __name__ == '__main__':
     print("Running unit tests")
     unittest.main()
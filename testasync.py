@@ -0,0 +1,181 @@
+import os
+import asyncio
+from visualcaptcha import *
+
+# Only imported by test.py from Python 3.7, as AsyncCaptcha needs it. Its tests are collected there only
+assetsFullPath = os.path.dirname(os.path.realpath(__file__)) + '/visualcaptcha/assets'
+
+
+# Session backend with async methods
+class AsyncMemoryBackend(object):
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+
+    async def get(self, key):
+        return self.backend.get(key)
+
+    async def set(self, key, value, ttl=None):
+        return self.backend.set(key, value, ttl)
+
+    async def getAndDelete(self, key):
+        return self.backend.getAndDelete(key)
+
+
+# Tests of AsyncCaptcha, mixed into a TestCase by test.py
+class AsyncCaptchaTests(object):
+
+    # Should generate, stream and validate with an in-memory session
+    def test_async_captcha(self):
+        async def run():
+            visualCaptcha = AsyncCaptcha(Captcha(Session({})))
+
+            await visualCaptcha.generate()
+
+            frontendData = await visualCaptcha.getFrontendData()
+            inlineFrontendData = await visualCaptcha.getInlineFrontendData()
+            image = await visualCaptcha.streamImage({}, 0)
+            audio = await visualCaptcha.streamAudio({}, 'ogg')
+            valid = await visualCaptcha.validateImage(visualCaptcha.captcha.getValidImageOption()['value'])
+
+            return frontendData, inlineFrontendData, image, audio, valid
+
+        frontendData, inlineFrontendData, image, audio, valid = asyncio.run(run())
+
+        self.assertEqual(len(frontendData['values']), 5)
+        self.assertEqual(len(inlineFrontendData['imageData']), 5)
+        self.assertTrue(image)
+        self.assertTrue(audio)
+        self.assertTrue(valid)
+
+    # Should stream cached files without the executor
+    def test_async_cached(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+        assetCache.preload(assetsFullPath)
+
+        async def run():
+            visualCaptcha = AsyncCaptcha(Captcha(Session({}), assetCache=assetCache), executor=False)
+
+            await visualCaptcha.generate()
+
+            return await visualCaptcha.streamImage({}, 1)
+
+        self.assertTrue(asyncio.run(run()))
+
+    # Should use async session backends
+    def test_async_backend_session(self):
+        backend = AsyncMemoryBackend()
+
+        async def run():
+            visualCaptcha = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user')))
+
+            await visualCaptcha.generate()
+
+            optionValue = visualCaptcha.captcha.getValidAudioOption()['value']
+
+            secondCaptcha = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user')))
+            audio = await secondCaptcha.streamAudio({})
+            firstValidation = await secondCaptcha.validateAudio(optionValue)
+
+            thirdCaptcha = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user')))
+            secondValidation = await thirdCaptcha.validateAudio(optionValue)
+
+            return audio, firstValidation, secondValidation
+
+        audio, firstValidation, secondValidation = asyncio.run(run())
+
+        self.assertTrue(audio)
+        self.assertTrue(firstValidation)
+        self.assertFalse(secondValidation)
+
+    # Should not validate a challenge loaded before it was validated, nor remove the challenge generated since
+    def test_async_stale(self):
+        backend = AsyncMemoryBackend()
+
+        async def run():
+            await AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user'))).generate()
+
+            firstRequest = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user')))
+            secondRequest = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user')))
+
+            await firstRequest.utilLoad()
+            await secondRequest.utilLoad()
+
+            optionValue = firstRequest.captcha.getValidImageOption()['value']
+            firstValidation = await firstRequest.validateImage(optionValue)
+
+            newCaptcha = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user')))
+            await newCaptcha.generate()
+
+            staleValidation = await secondRequest.validateImage(optionValue)
+            newValidation = await AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user'))).validateImage(newCaptcha.captcha.getValidImageOption()['value'])
+
+            return firstValidation, staleValidation, newValidation
+
+        self.assertEqual(asyncio.run(run()), (True, False, True))
+
+    # Should read streamed files that aren't cached in the executor, so iterating the response doesn't block
+    def test_async_streamed(self):
+        global assetsFullPath
+
+        assetCache = AssetCache()
+        assetCache.preload(assetsFullPath)
+
+        async def run():
+            visualCaptcha = AsyncCaptcha(Captcha(Session({})))
+            cachedCaptcha = AsyncCaptcha(Captcha(visualCaptcha.captcha.session, assetCache=assetCache))
+
+            await visualCaptcha.generate()
+
+            image = await visualCaptcha.streamImage({}, 0, streamed=True)
+            cachedImage = await cachedCaptcha.streamImage({}, 0, streamed=True)
+
+            return visualCaptcha.captcha.getImageFilePath(0), image, cachedImage
+
+        filePath, image, cachedImage = asyncio.run(run())
+
+        with open(filePath, 'rb') as f:
+            fileContent = f.read()
+
+        self.assertIsInstance(image, bytes)
+        self.assertTrue(image.startswith(fileContent))
+        self.assertIsInstance(cachedImage, AssetStream)
+        self.assertTrue(b''.join(cachedImage).startswith(fileContent))
+
+    # Should count the validations of async sessions, like the blocking ones
+    def test_async_metrics(self):
+        backend = AsyncMemoryBackend()
+        metrics = Metrics()
+
+        async def run():
+            visualCaptcha = AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user'), metrics=metrics))
+
+            await visualCaptcha.generate()
+
+            optionValue = visualCaptcha.captcha.getValidImageOption()['value']
+
+            await AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user'), metrics=metrics)).validateImage(optionValue)
+            await AsyncCaptcha(Captcha(AsyncBackendSession(backend, 'user'), metrics=metrics)).validateAudio('wrong')
+
+        asyncio.run(run())
+
+        exposition = metrics.exposition()
+
+        self.assertIn('visualcaptcha_validations_total{result="success",type="image"} 1', exposition)
+        self.assertIn('visualcaptcha_validations_total{result="failure",type="audio"} 1', exposition)
+        self.assertIn('visualcaptcha_validate_seconds_count{type="image"} 1', exposition)
+
+    # Should run the blocking session calls in the executor
+    def test_async_blocking_session(self):
+        backend = MemoryBackend()
+
+        async def run():
+            visualCaptcha = AsyncCaptcha(Captcha(BackendSession(backend, 'user')))
+
+            await visualCaptcha.generate()
+
+            return await visualCaptcha.streamImage({}, 0)
+
+        self.assertTrue(asyncio.run(run()))
@@ -0,0 +1,154 @@
+import os
+import base64
+import threading
+from collections import OrderedDict
+
+
+class AssetCache(object):
+
+    # @param maxBytes is optional. The memory ceiling for cached files. Defaults to 64MB
+    def __init__(self, maxBytes=64 * 1024 * 1024):
+        self.maxBytes = int(maxBytes)
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._files = OrderedDict()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    # Check if a file is cached, without counting a hit or a miss
+    def __contains__(self, filePath):
+        return filePath in self._files
+
+    # Get the contents of a file, reading it from disk only if it's not cached yet
+    # @param filePath is the full path of the file
+    # Returns None if the file doesn't exist
+    def get(self, filePath):
+        with self._lock:
+            content = self._files.get(filePath)
+
+            if content is not None:
+                self.hits += 1
+
+                # Mark as recently used
+                del self._files[filePath]
+                self._files[filePath] = content
+
+                return content
+
+            self.misses += 1
+
+        content = self.utilReadFile(filePath)
+
+        if content is not None:
+            self.put(filePath, content)
+
+        return content
+
+    # Add the contents of a file to the cache, evicting the least recently used files if needed
+    def put(self, filePath, content):
+        # Files bigger than the whole cache are never kept
+        if len(content) > self.maxBytes:
+            return
+
+        with self._lock:
+            if filePath in self._files:
+                self.utilRemove(filePath)
+
+            self._files[filePath] = content
+            self.size += len(content)
+
+            self.utilEvict()
+
+    # Get the base64 encoding of a file, split so noise can be encoded separately and appended
+    # The encoding of the file's first bytes, a multiple of 3, is cached with the file
+    # Returns an (encodedPrefix, remainder) tuple, with the last 0 to 2 bytes of the file not encoded yet,
+    # or None if the file doesn't exist
+    def getBase64(self, filePath):
+        content = self.get(filePath)
+
+        if content is None:
+            return None
+
+        encoded = self._encoded.get(filePath)
+
+        if encoded is None:
+            split = len(content) - len(content) % 3
+            encoded = (base64.b64encode(content[:split]), content[split:])
+
+            with self._lock:
+                # Only kept while the file itself is cached
+                if self._files.get(filePath) is content and filePath not in self._encoded:
+                    self._encoded[filePath] = encoded
+                    self.size += len(encoded[0])
+
+                    self.utilEvict()
+
+        return encoded
+
+    # Read all the images and audios into the cache
+    # @param assetsPath is the full path to the assets directory
+    def preload(self, assetsPath):
+        for directory in ('images', 'audios'):
+            directoryPath = assetsPath + '/' + directory
+
+            if (not os.path.isdir(directoryPath)):
+                continue
+
+            for fileName in sorted(os.listdir(directoryPath)):
+                filePath = directoryPath + '/' + fileName
+                content = self.utilReadFile(filePath)
+
+                if content is not None:
+                    self.put(filePath, content)
+
+    # Remove all the files from the cache
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._encoded.clear()
+            self.size = 0
+
+    # Get the cache counters
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'files': len(self._files),
+                'size': self.size,
+                'maxBytes': self.maxBytes
+            }
+
+    # Evict the least recently used files until the cache fits in maxBytes. Must be called with the lock held
+    def utilEvict(self):
+        while self.size > self.maxBytes:
+            self.utilRemove(next(iter(self._files)))
+            self.evictions += 1
+
+    # Remove a file and its encoding. Must be called with the lock held
+    def utilRemove(self, filePath):
+        self.size -= len(self._files.pop(filePath))
+
+        encoded = self._encoded.pop(filePath, None)
+
+        if encoded is not None:
+            self.size -= len(encoded[0])
+
+    # Read a file from disk. Returns None if the file doesn't exist. Also used by PackStore and Captcha
+    @staticmethod
+    def utilReadFile(filePath):
+        # Opening the file tells if it exists, without another stat call
+        try:
+            f = open(filePath, 'rb')
+        except (IOError, OSError):
+            return None
+
+        content = f.read()
+        f.close()
+
+        return content
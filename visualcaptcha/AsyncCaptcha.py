@@ -0,0 +1,210 @@
+import asyncio
+import inspect
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .BackendSession import BackendSession
+from .Metrics import timer
+
+
+class AsyncCaptcha(object):
+
+    # The executor shared by all the AsyncCaptcha instances without their own
+    _executor = None
+    _lock = threading.Lock()
+
+    # @param captcha is the Captcha to run
+    # @param executor is optional. The executor for blocking file reads and session calls. Defaults to a shared one
+    # @param maxWorkers is optional. The number of threads of the shared executor, when it's created. Defaults to 8
+    def __init__(self, captcha, executor=None, maxWorkers=8):
+        self.captcha = captcha
+        self.executor = executor if executor is not None else AsyncCaptcha.sharedExecutor(maxWorkers)
+
+    # Get the executor shared by all the AsyncCaptcha instances, creating it on first use
+    @classmethod
+    def sharedExecutor(cls, maxWorkers=8):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=maxWorkers)
+
+        return cls._executor
+
+    # Generate a new valid option
+    # @param numberOfOptions is optional. Defaults to 5
+    async def generate(self, numberOfOptions=5):
+        await self.utilLoad()
+        await self.utilCall(self.captcha.generate, numberOfOptions)
+        await self.utilSave()
+
+    # Stream audio file. Same parameters as Captcha.streamAudio
+    async def streamAudio(self, headers, fileType='mp3', streamed=False, rangeHeader=None):
+        await self.utilLoad()
+
+        # Streaming only reads the session, so there's nothing to save
+        if self.utilIsCached(self.captcha.getAudioFilePath, fileType):
+            return await self.utilCall(self.captcha.streamAudio, headers, fileType, streamed, rangeHeader)
+
+        # Iterating a stream of a file on disk would read it on the event loop, so it's read whole in the executor instead
+        return await self.utilRun(self.captcha.streamAudio, headers, fileType, False, rangeHeader)
+
+    # Stream image file given an index in the session visualCaptcha images array. Same parameters as Captcha.streamImage
+    async def streamImage(self, headers, index, isRetina=False, streamed=False):
+        await self.utilLoad()
+
+        if self.utilIsCached(self.captcha.getImageFilePath, index, isRetina):
+            return await self.utilCall(self.captcha.streamImage, headers, index, isRetina, streamed)
+
+        return await self.utilRun(self.captcha.streamImage, headers, index, isRetina, False)
+
+    # Get data to be used by the frontend
+    async def getFrontendData(self):
+        await self.utilLoad()
+
+        return await self.utilCall(self.captcha.getFrontendData)
+
+    # Get data to be used by the frontend, with the images inline. Same parameters as Captcha.getInlineFrontendData
+    async def getInlineFrontendData(self, isRetina=False):
+        await self.utilLoad()
+
+        return await self.utilRun(self.captcha.getInlineFrontendData, isRetina)
+
+    # Validate the sent image value with the validImageOption
+    async def validateImage(self, sentOption):
+        await self.utilLoad()
+
+        if isinstance(self.captcha.session, AsyncBackendSession):
+            return await self.utilValidate('image', self.captcha.getValidImageOption(), sentOption)
+
+        return await self.utilCall(self.captcha.validateImage, sentOption)
+
+    # Validate the sent audio value with the validAudioOption
+    async def validateAudio(self, sentOption):
+        await self.utilLoad()
+
+        if isinstance(self.captcha.session, AsyncBackendSession):
+            return await self.utilValidate('audio', self.captcha.getValidAudioOption(), sentOption)
+
+        return await self.utilCall(self.captcha.validateAudio, sentOption)
+
+    # Validate with an async session, consuming the challenge without blocking. Same as Captcha.validateImage and validateAudio
+    # @param validationType is 'image' or 'audio'
+    async def utilValidate(self, validationType, validOption, sentOption):
+        start = timer() if self.captcha.metrics is not None else None
+
+        if (validOption):
+            key = 'validImageOption' if validationType == 'image' else 'validAudioOption'
+            validOption = self.captcha.utilConsumedOption(await self.captcha.session.consumeAsync(), key, validOption)
+
+            # A newer challenge removed by consumeAsync was committed back
+            await self.utilSave()
+
+        valid = (validOption is not None and sentOption == validOption['value'])
+
+        if (start is not None):
+            self.captcha.utilRecordValidation(validationType, start, valid)
+
+        return valid
+
+    # Check if the streamed file is in the Captcha's asset cache, so it can be read without blocking
+    # @param getFilePath is the Captcha method returning the file path, called with args
+    def utilIsCached(self, getFilePath, *args):
+        # Getting the path reads the session, which may block
+        if isinstance(self.captcha.session, BackendSession):
+            return False
+
+        filePath = getFilePath(*args)
+        assetCache = self.captcha.assetCache
+
+        return filePath is None or (assetCache is not None and filePath in assetCache)
+
+    # Call a Captcha method, in the executor if the session may block
+    async def utilCall(self, method, *args):
+        if isinstance(self.captcha.session, BackendSession):
+            return await self.utilRun(method, *args)
+
+        return method(*args)
+
+    # Call a Captcha method in the executor
+    async def utilRun(self, method, *args):
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
+
+    # Read the async session data, if needed
+    async def utilLoad(self):
+        if isinstance(self.captcha.session, AsyncBackendSession):
+            await self.captcha.session.load()
+
+    # Write the async session data, if it changed
+    async def utilSave(self):
+        if isinstance(self.captcha.session, AsyncBackendSession):
+            await self.captcha.session.save()
+
+
+class AsyncBackendSession(object):
+
+    # Same as BackendSession, but the backend can be async. The data is read with load() and written with save()
+    # @param backend is the SessionBackend storing the session data. Its methods can return awaitables
+    # @param sessionId is the id of the user's session
+    # @param namespace is optional. Defaults to 'visualcaptcha'
+    # @param ttl is optional. Number of seconds the session data is kept for. Defaults to 600
+    # @param singleUse is optional. If true, the challenge is removed when validated. Defaults to true
+    def __init__(self, backend, sessionId, namespace='visualcaptcha', ttl=600, singleUse=True):
+        self.backend = backend
+        self.key = namespace + ':' + sessionId
+        self.ttl = ttl
+        self.singleUse = singleUse
+
+        self.data = None
+        self.changed = False
+
+    def clear(self):
+        self.data = {}
+        self.changed = True
+
+    def get(self, key):
+        return (self.data or {}).get(key, None)
+
+    def set(self, key, value):
+        if self.data is None:
+            self.data = {}
+
+        self.data[key] = value
+        self.changed = True
+
+    def commit(self, values):
+        self.data = dict(values)
+        self.changed = True
+
+    # Consuming needs the backend, so it can't be done by the blocking Captcha
+    def consume(self):
+        raise TypeError('AsyncBackendSession can only be validated with AsyncCaptcha')
+
+    # Read the session data from the backend, once
+    async def load(self):
+        if self.data is None:
+            self.data = (await self.utilResolve(self.backend.get(self.key))) or {}
+
+    # Write the session data to the backend, if it changed
+    async def save(self):
+        if self.changed:
+            await self.utilResolve(self.backend.set(self.key, self.data, self.ttl))
+            self.changed = False
+
+    # Remove the challenge atomically, so it can only be validated once. Same as BackendSession.consume
+    # Returns the session data that was removed, which may be a newer challenge than the loaded one, or None if it was already removed
+    async def consumeAsync(self):
+        if not self.singleUse:
+            return self.data
+
+        data = await self.utilResolve(self.backend.getAndDelete(self.key))
+        self.data = {}
+
+        return data
+
+    async def utilResolve(self, value):
+        if inspect.isawaitable(value):
+            value = await value
+
+        return value
@@ -0,0 +1,52 @@
+class BackendSession(object):
+
+    # @param backend is the SessionBackend storing the session data
+    # @param sessionId is the id of the user's session
+    # @param namespace is optional. Defaults to 'visualcaptcha'
+    # @param ttl is optional. Number of seconds the session data is kept for. Defaults to 600
+    # @param singleUse is optional. If true, the challenge is removed when validated. Defaults to true
+    def __init__(self, backend, sessionId, namespace='visualcaptcha', ttl=600, singleUse=True):
+        self.backend = backend
+        self.key = namespace + ':' + sessionId
+        self.ttl = ttl
+        self.singleUse = singleUse
+
+        # The session data is read from the backend once, on first use
+        self.data = None
+
+    def clear(self):
+        self.data = {}
+        self.backend.delete(self.key)
+
+    def get(self, key):
+        return self.utilData().get(key, None)
+
+    def set(self, key, value):
+        data = self.utilData()
+        data[key] = value
+
+        self.backend.set(self.key, data, self.ttl)
+
+    # Replace all the session data with a single write
+    def commit(self, values):
+        self.data = dict(values)
+
+        self.backend.set(self.key, self.data, self.ttl)
+
+    # Remove the challenge atomically, so it can only be validated once
+    # Returns the session data that was removed, which may be a newer challenge than the loaded one, or None if it was already removed
+    def consume(self):
+        if not self.singleUse:
+            return self.utilData()
+
+        data = self.backend.getAndDelete(self.key)
+        self.data = {}
+
+        return data
+
+    # Get the session data, reading it from the backend if needed
+    def utilData(self):
+        if self.data is None:
+            self.data = self.backend.get(self.key) or {}
+
+        return self.data
@@ -1,182 +1,346 @@
 import os
+import base64
 import re
-import json
 import random
 import mimetypes
 import binascii
+import hashlib
+import struct
+
+from .Catalog import Catalog
+from .Stream import AssetStream
+from .AssetCache import AssetCache
+from .Metrics import timer
+from .TokenSource import TokenSource
+from .Manifest import Manifest
 
 
 class Captcha(object):
 
+    # The source of the random values, field names and noise, shared by all the instances
+    tokenSource = TokenSource()
+
+    # Mime types by file extension, so the mimetypes module is only used once for each
+    _mimeTypes = {}
+
     # @param session is the default session object
     # @param Assets path. By default, it will be ./assets
     # @param defaultImages is optional. Defaults to the array inside ./images.json. The path is relative to ./assets/images/
     # @param defaultAudios is optional. Defaults to the array inside ./audios.json. The path is relative to ./assets/audios/
-    def __init__(self, session={}, assetsPath='', defaultImages=[], defaultAudios=[]):
+    # @param assetCache is optional. An AssetCache or a PackStore to serve the streamed files from memory
+    # @param challengePool is optional. A ChallengePool with challenges generated in the background
+    # @param compactSession boolean. Defaults to false. If true, the session only stores a short string with the challenge
+    # @param metrics is optional. A Metrics registry to record latencies and counts in
+    # @param noiseVariants is optional. A NoiseVariants with the images already padded with noise
+    # @param catalog is optional. A Catalog to use instead of the shared one for assetsPath, defaultImages and defaultAudios
+    # @param manifest is optional. A Manifest with the files of all the options, so they're found without touching the disk
+    def __init__(self, session={}, assetsPath='', defaultImages=[], defaultAudios=[], assetCache=None, challengePool=None, compactSession=False, metrics=None, noiseVariants=None, catalog=None, manifest=None):
         # Attach the session object reference to visualCaptcha
         self.session = session
 
-        # If no assetsPath is specified, set the default
-        if (not assetsPath or assetsPath == ''):
-            self.assetsPath = os.path.dirname(os.path.realpath(__file__)) + '/assets'
-        else:
-            self.assetsPath = assetsPath
+        # Attach the asset cache, if any
+        self.assetCache = assetCache
+
+        # Attach the challenge pool, if any
+        self.challengePool = challengePool
+
+        # Attach the noisy variants, if any
+        self.noiseVariants = noiseVariants
 
-        # If there are no defaultImages, get them from ./images.json
-        if (not defaultImages or len(defaultImages) == 0):
-            defaultImages = self.utilReadJSON(self.assetsPath + '/images.json')
+        # Attach the asset manifest, if any
+        self.manifest = manifest
 
-        # If there are no defaultAudios, get them from ./audios.json
-        if (not defaultAudios or len(defaultAudios) == 0):
-            defaultAudios = self.utilReadJSON(self.assetsPath + '/audios.json')
+        self.compactSession = compactSession
+
+        # Attach the metrics registry, if any. Without it, nothing is measured
+        self.metrics = metrics
+
+        # The last decoded compact challenge, so the option dicts are only rebuilt when it changes
+        self._compactChallenge = (None, None)
+
+        # Get the process-wide catalog, so the JSON files are only read once
+        self.catalog = catalog if catalog is not None else Catalog.load(assetsPath, defaultImages, defaultAudios)
+
+        self.assetsPath = self.catalog.assetsPath
 
         # Attach the images object reference to visualCaptcha
-        self.imageOptions = defaultImages
+        self.imageOptions = self.catalog.imageOptions
 
         # Attach the audios object reference to visualCaptcha
-        self.audioOptions = defaultAudios
+        self.audioOptions = self.catalog.audioOptions
 
     # Generate a new valid option
     # @param numberOfOptions is optional. Defaults to 5
     def generate(self, numberOfOptions=5):
-        imageValues = []
+        start = timer() if self.metrics is not None else None
 
         # Save previous image & audio options from session
         oldImageOption = self.getValidImageOption()
         oldAudioOption = self.getValidAudioOption()
 
-        # Reset the session data
-        self.session.clear()
+        challenge = self.utilPooledChallenge(numberOfOptions, oldImageOption, oldAudioOption)
 
-        # Avoid the next IF failing if a string with a number is sent
-        numberOfOptions = int(numberOfOptions)
+        # Generate the challenge now if there's no ready one
+        if (challenge is None):
+            challenge = self.catalog.createChallenge(numberOfOptions, self.utilRandomHex, oldImageOption, oldAudioOption)
 
-        # Set the minimum numberOfOptions to four
-        if (numberOfOptions < 4):
-            numberOfOptions = 4
+        self.setChallenge(challenge)
 
-        # Shuffle all imageOptions
-        random.shuffle(self.imageOptions)
+        if (start is not None):
+            self.metrics.observe('generate_seconds', timer() - start)
 
-        # Get a random sample of X images
-        images = random.sample(self.imageOptions, numberOfOptions)
-
-        # Set a random value for each of the images, to be used in the frontend
-        for image in images:
-            randomValue = self.utilRandomHex(10)
-            imageValues.append(randomValue)
-
-            image['value'] = randomValue
+    # Generate many independent challenges, to be attached to sessions later with setChallenge
+    # Returns them as compact strings from Catalog.encodeChallenge, built in one pass by Catalog.createChallenges
+    # @param count is the number of challenges to generate
+    # @param numberOfOptions is optional. Defaults to 5
+    def generateMany(self, count, numberOfOptions=5):
+        return self.catalog.createChallenges(count, numberOfOptions, self.utilRandomHex)
 
-        self.session.set('images', images)
+    # Replace the session data with a challenge, from generateMany or Catalog.createChallenge
+    def setChallenge(self, challenge):
+        encodedChallenge = None
 
-        # Select a random image option, pluck current valid image option
-        condition = True
-        while condition:
-            newImageOption = random.sample(self.getImageOptions(), 1)[0]
+        # Compact strings are stored as they are in compact sessions
+        if (not isinstance(challenge, dict)):
+            encodedChallenge = challenge
+            challenge = self.catalog.decodeChallenge(encodedChallenge)
 
-            condition = (oldImageOption and oldImageOption['path'] == newImageOption['path'])
+            if (challenge is None):
+                raise ValueError('The challenge doesn\'t match this catalog')
 
-        self.session.set('validImageOption', newImageOption)
+        if (self.compactSession):
+            values = {'challenge': encodedChallenge or self.catalog.encodeChallenge(challenge)}
+        else:
+            values = {
+                'images': challenge['images'],
+                'validImageOption': challenge['validImageOption'],
+                'validAudioOption': challenge['validAudioOption'],
+                'audioNoiseSeed': challenge.get('audioNoiseSeed'),
+                'frontendData': challenge['frontendData']
+            }
 
-        # Select a random audio option, pluck current valid audio option
-        condition = True
-        while condition:
-            newAudioOption = random.sample(self.audioOptions, 1)[0]
+        commit = getattr(self.session, 'commit', None)
 
-            condition = (oldAudioOption and oldAudioOption['path'] == newAudioOption['path'])
+        # Write the whole challenge at once, so a half-written one is never seen
+        if (commit is not None):
+            commit(values)
 
-        self.session.set('validAudioOption', newAudioOption)
+            return
 
-        # Set random hashes for audio and image field names, and add it in the frontend data object
-        validImageOption = self.getValidImageOption()
+        # Reset the session data, for sessions without commit
+        self.session.clear()
 
-        self.session.set('frontendData', {
-            'values': imageValues,
-            'imageName': validImageOption['name'],
-            'imageFieldName': self.utilRandomHex(10),
-            'audioFieldName': self.utilRandomHex(10)
-        })
+        for key, value in values.items():
+            self.session.set(key, value)
 
     # Stream audio file
     # @param headers object. used to store http headers for streaming
     # @param fileType defaults to 'mp3', can also be 'ogg'
-    def streamAudio(self, headers, fileType='mp3'):
-        audioOption = self.getValidAudioOption()
-        # If there's no audioOption, we set the file name as empty
-        audioFileName = audioOption['path'] if audioOption else ''
+    # @param streamed boolean. Defaults to false. If true, returns an AssetStream instead of the file contents
+    # @param rangeHeader is optional. The request's Range header. If satisfiable, Content-Range is set and only that part is returned
+    def streamAudio(self, headers, fileType='mp3', streamed=False, rangeHeader=None):
+        start = timer() if self.metrics is not None else None
+        content = False
 
-        audioFilePath = self.assetsPath + '/audios/' + audioFileName
+        audioFilePath = self.getAudioFilePath(fileType)
 
-        # If the file name is empty, we skip any work and return a 404 response
-        if (audioFileName != ''):
-            # We need to replace '.mp3' with '.ogg' if the fileType == 'ogg'
-            if (fileType == 'ogg'):
-                audioFilePath = re.sub(r'(?i)\.mp3', '.ogg', audioFilePath)
-            else:
-                # This isn't doing anything, really, but I feel better with it
+        # If there's no audio file, we skip any work and return a 404 response
+        if (audioFilePath is not None):
+            if (fileType != 'ogg'):
                 fileType = 'mp3'
 
-            return self.utilStreamFile(headers, audioFilePath)
+            # The noise must be the same for every range of this challenge's audio
+            # Challenges without a seed get random noise, and ranges are ignored
+            noiseSeed = self.getAudioNoiseSeed()
+
+            if (noiseSeed is not None):
+                noiseSeed += fileType
 
-        return False
+            content = self.utilStreamFile(headers, audioFilePath, streamed, rangeHeader, noiseSeed)
+
+        if (start is not None):
+            self.utilRecordStream('audio', start, content)
+
+        return content
 
     # Stream image file given an index in the session visualCaptcha images array
     # @param headers object. used to store http headers for streaming
     # @param index of the image in the session images array to send
     # @param isRetina boolean. Defaults to false
-    def streamImage(self, headers, index, isRetina=False):
-        imageOption = self.getImageOptionAtIndex(index)
+    # @param streamed boolean. Defaults to false. If true, returns an AssetStream instead of the file contents
+    def streamImage(self, headers, index, isRetina=False, streamed=False):
+        start = timer() if self.metrics is not None else None
+        content = False
+
+        imageFilePath = self.getImageFilePath(index, isRetina)
+
+        # If the index is non-existent, there's no file, same as if the options weren't generated
+        if (imageFilePath is not None):
+            content = self.utilStreamFile(headers, imageFilePath, streamed)
+
+        if (start is not None):
+            self.utilRecordStream('image', start, content)
+
+        return content
+
+    # Stream all the images of the current challenge in a single response
+    # Each image, with its own noise, is preceded by its length as a 4 byte big-endian integer
+    # Returns false if the options weren't generated or a file doesn't exist
+    # @param headers is a dict with the HTTP headers to be set
+    # @param isRetina boolean. Defaults to false
+    def streamImageBundle(self, headers, isRetina=False):
+        start = timer() if self.metrics is not None else None
+        content = False
+
+        # The session is only read once for all the images
+        imageOptions = self.getImageOptions()
+
+        if (imageOptions):
+            parts = []
+
+            for imageOption in imageOptions:
+                imageContent = self.utilStreamFile({}, self.utilImageFilePath(imageOption, isRetina))
+
+                if (imageContent is False):
+                    parts = None
+                    break
+
+                parts.append(struct.pack('>I', len(imageContent)))
+                parts.append(imageContent)
+
+            if (parts is not None):
+                content = b''.join(parts)
+
+                headers['Content-Type'] = 'application/octet-stream'
+                headers['Content-Length'] = str(len(content))
+
+                # Make sure this is not cached
+                headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+                headers['Pragma'] = 'no-cache'
+                headers['Expires'] = 0
+
+        if (start is not None):
+            self.utilRecordStream('bundle', start, content)
+
+        return content
+
+    # Get the full path of the current audio file, or None if there's no valid audio option
+    # @param fileType defaults to 'mp3', can also be 'ogg'
+    def getAudioFilePath(self, fileType='mp3'):
+        audioOption = self.getValidAudioOption()
+        # If there's no audioOption, we set the file name as empty
+        audioFileName = audioOption['path'] if audioOption else ''
+
+        if (audioFileName == ''):
+            return None
+
+        # Any fileType other than 'ogg' gets the mp3 file
+        if (fileType != 'ogg'):
+            fileType = 'mp3'
+
+        if (self.manifest is not None):
+            return self.manifest.getAudioPath(audioFileName, fileType)
+
+        # We need to replace '.mp3' with '.ogg' if the fileType == 'ogg'
+        if (fileType == 'ogg'):
+            audioFileName = Manifest.variantPath(audioFileName, '.mp3', '.ogg')
+
+        return self.assetsPath + '/audios/' + audioFileName
+
+    # Get the full path of the image file at index, or None if there's no image option at index
+    # @param isRetina boolean. Defaults to false
+    def getImageFilePath(self, index, isRetina=False):
+        return self.utilImageFilePath(self.getImageOptionAtIndex(index), isRetina)
+
+    # Get the full path of an image option's file, or None if there's no image option
+    def utilImageFilePath(self, imageOption, isRetina=False):
         # If there's no imageOption, we set the file name as empty
         imageFileName = imageOption['path'] if imageOption else ''
-        imageFilePath = self.assetsPath + '/images/' + imageFileName
+
+        if (imageFileName == ''):
+            return None
 
         # Force boolean for isRetina
-        if isRetina:
-            isRetina = 1
-        else:
-            isRetina = 0
+        isRetina = bool(isRetina)
 
-        isRetina = int(isRetina) >= 1
+        if (self.manifest is not None):
+            return self.manifest.getImagePath(imageFileName, isRetina)
 
         # If retina is requested, change the file name
         if (isRetina):
-            imageFileName = re.sub(r'(?i)\.png', '@2x.png', imageFileName)
-            imageFilePath = re.sub(r'/(?i)\.png', '@2x.png', imageFilePath)
+            imageFileName = Manifest.variantPath(imageFileName, '.png', '@2x.png')
 
-        # If the index is non-existent, the file name will be empty, same as if the options weren't generated
-        if (imageFileName != ''):
-            return self.utilStreamFile(headers, imageFilePath)
+        return self.assetsPath + '/images/' + imageFileName
 
-        return False
+    # Get the secret used to generate the current audio's noise, created with the challenge
+    # Returns None if there's no challenge, or it was created without a seed
+    def getAudioNoiseSeed(self):
+        return self.utilSessionGet('audioNoiseSeed') or None
 
     # Get data to be used by the frontend
     def getFrontendData(self):
-        return self.session.get('frontendData')
+        return self.utilSessionGet('frontendData')
+
+    # Get data to be used by the frontend, with the images inline as data URIs in 'imageData', so no other request is needed
+    # Each image has its own noise, like with streamImage. Returns None if the options weren't generated or a file doesn't exist
+    # @param isRetina boolean. Defaults to false
+    def getInlineFrontendData(self, isRetina=False):
+        frontendData = self.getFrontendData()
+        imageOptions = self.getImageOptions()
+
+        if (not frontendData or not imageOptions):
+            return None
+
+        imageData = []
+
+        for imageOption in imageOptions:
+            dataUri = self.utilDataUri(self.utilImageFilePath(imageOption, isRetina))
+
+            if (dataUri is None):
+                return None
+
+            imageData.append(dataUri)
+
+        inlineFrontendData = dict(frontendData)
+        inlineFrontendData['imageData'] = imageData
+
+        return inlineFrontendData
 
     # Get the current validImageOption
     def getValidImageOption(self):
-        return self.session.get('validImageOption')
+        return self.utilSessionGet('validImageOption')
 
     # Get the current validAudioOption
     def getValidAudioOption(self):
-        return self.session.get('validAudioOption')
+        return self.utilSessionGet('validAudioOption')
 
     # Validate the sent image value with the validImageOption
     def validateImage(self, sentOption):
-        validImageOption = self.getValidImageOption()
+        start = timer() if self.metrics is not None else None
 
-        return (sentOption == validImageOption['value'])
+        validImageOption = self.utilConsume('validImageOption', self.getValidImageOption())
+        valid = (validImageOption is not None and sentOption == validImageOption['value'])
+
+        if (start is not None):
+            self.utilRecordValidation('image', start, valid)
+
+        return valid
 
     # Validate the sent audio value with the validAudioOption
     def validateAudio(self, sentOption):
-        validAudioOption = self.getValidAudioOption()
+        start = timer() if self.metrics is not None else None
+
+        validAudioOption = self.utilConsume('validAudioOption', self.getValidAudioOption())
+        valid = (validAudioOption is not None and sentOption == validAudioOption['value'])
 
-        return (sentOption == validAudioOption['value'])
+        if (start is not None):
+            self.utilRecordValidation('audio', start, valid)
+
+        return valid
 
     # Return generated image options
     def getImageOptions(self):
-        return self.session.get('images')
+        return self.utilSessionGet('images')
 
     # Return generated image option at index
     def getImageOptionAtIndex(self, index):
@@ -189,37 +353,165 @@ class Captcha(object):
     def getAudioOption(self):
         return self.getValidAudioOption()
 
-    # Return all the image options
+    # Return all the image options, as a new list of dicts
     def getAllImageOptions(self):
-        return self.imageOptions
+        return list(self.imageOptions)
 
-    # Return all the audio options
+    # Return all the audio options, as a new list of dicts
     def getAllAudioOptions(self):
-        return self.audioOptions
+        return list(self.audioOptions)
+
+    # Get challenge data from the session, decoding it first for compact sessions
+    def utilSessionGet(self, key):
+        if (not self.compactSession):
+            return self.session.get(key)
+
+        return self.utilChallengeGet(self.session.get('challenge'), key)
+
+    # Get challenge data from a compact challenge string, keeping the last decoded one
+    def utilChallengeGet(self, encodedChallenge, key):
+        if (not encodedChallenge):
+            return None
+
+        if (self._compactChallenge[0] != encodedChallenge):
+            self._compactChallenge = (encodedChallenge, self.catalog.decodeChallenge(encodedChallenge))
+
+        challenge = self._compactChallenge[1]
+
+        return challenge[key] if challenge else None
+
+    # Mark the challenge as used, for sessions that only allow validating once
+    # Returns the valid option to check the sent value against, or None if the challenge was already used or replaced
+    # @param key is 'validImageOption' or 'validAudioOption'
+    # @param validOption is the valid option loaded from the session
+    def utilConsume(self, key, validOption):
+        if (not validOption):
+            return None
+
+        consume = getattr(self.session, 'consume', None)
+
+        if (consume is None):
+            return validOption
+
+        return self.utilConsumedOption(consume(), key, validOption)
+
+    # Get the valid option of the session data removed by consume, if it's still the loaded one
+    # If another request generated a new challenge since it was loaded, the new one is put back, so the old answer can't remove it
+    def utilConsumedOption(self, data, key, validOption):
+        if (not data):
+            return None
+
+        consumedOption = data.get(key) if not self.compactSession else self.utilChallengeGet(data.get('challenge'), key)
+
+        if (consumedOption == validOption):
+            return consumedOption
+
+        commit = getattr(self.session, 'commit', None)
+
+        if (commit is not None):
+            commit(data)
+
+        return None
+
+    # Get a ready challenge from the challenge pool, if it matches the requested options
+    def utilPooledChallenge(self, numberOfOptions, oldImageOption, oldAudioOption):
+        pool = self.challengePool
+
+        if (pool is None or pool.catalog is not self.catalog or pool.numberOfOptions != max(int(numberOfOptions), 4)):
+            return None
+
+        challenge = pool.get()
+
+        if (challenge is None):
+            return None
+
+        # The previous valid options can't be chosen again
+        if (oldImageOption and oldImageOption['path'] == challenge['validImageOption']['path']):
+            return None
+
+        if (oldAudioOption and oldAudioOption['path'] == challenge['validAudioOption']['path']):
+            return None
+
+        return challenge
 
     # Create a hex string from random bytes
     def utilRandomHex(self, count):
-        return str(binascii.hexlify(os.urandom(count)))
+        return self.tokenSource.hex(count)
 
-    # Create a hex string from random bytes
+    # Create hex bytes from random bytes
     def utilRandomHexBytes(self, count):
-        return binascii.hexlify(os.urandom(count))
+        return self.tokenSource.hexBytes(count)
 
-    # Read input file as JSON
-    def utilReadJSON(self, filePath):
-        if (not os.path.isfile(filePath)):
+    # Create a hex string from bytes derived from a secret seed, so the same seed always gives the same string
+    def utilSeededHexBytes(self, seed, count):
+        seed = seed.encode('utf-8')
+        randomBytes = b''
+        counter = 0
+
+        while len(randomBytes) < count:
+            randomBytes += hashlib.sha256(seed + b':' + str(counter).encode('ascii')).digest()
+            counter += 1
+
+        return binascii.hexlify(randomBytes[:count])
+
+    # Parse a "bytes=start-end" Range header for a file of the given length
+    # Returns a (start, end) tuple, or None if the header is missing, has multiple ranges or can't be satisfied
+    def utilParseRange(self, rangeHeader, length):
+        if (not rangeHeader or length == 0):
             return None
 
-        json_data = open(filePath)
-        data = json.load(json_data)
-        json_data.close()
+        match = re.match(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', rangeHeader)
 
-        return data
+        if (not match or (match.group(1) == '' and match.group(2) == '')):
+            return None
+
+        if (match.group(1) == ''):
+            # Suffix range, with the last N bytes
+            start = max(length - int(match.group(2)), 0)
+            end = length - 1
+        else:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) != '' else length - 1
+
+        end = min(end, length - 1)
+
+        if (start >= length or start > end):
+            return None
+
+        return (start, end)
+
+    # Read input file as JSON
+    def utilReadJSON(self, filePath):
+        return Catalog.utilReadJSON(filePath)
 
     # Stream file from path
-    def utilStreamFile(self, headers, filePath):
-        if (not os.path.isfile(filePath)):
-            return False
+    # @param streamed boolean. Defaults to false. If true, returns an AssetStream that sends the file and the noise as separate chunks
+    # @param rangeHeader is optional. The request's Range header. Only used with a noiseSeed, so all ranges share the same noise
+    # @param noiseSeed is optional. A secret to derive the noise from, instead of random noise for every response
+    def utilStreamFile(self, headers, filePath, streamed=False, rangeHeader=None, noiseSeed=None):
+        useVariants = noiseSeed is None and self.noiseVariants is not None
+        fileEntry = None
+
+        if (useVariants):
+            # The variant already has its noise, so it's sent as is
+            content = self.noiseVariants.get(filePath, self.utilReadFile)
+
+            if (content is None):
+                return False
+        elif (streamed and self.assetCache is None):
+            # The file is sent straight from disk, so don't read it here
+            content = None
+
+            if (self.manifest is not None):
+                fileEntry = self.manifest.getFile(filePath)
+
+            if (fileEntry is None and not os.path.isfile(filePath)):
+                return False
+        else:
+            content = self.utilReadFile(filePath)
+
+            if (content is None):
+                return False
 
         mimeType = self.getMimeType(filePath)
 
@@ -231,15 +523,119 @@ class Captcha(object):
         headers['Pragma'] = 'no-cache'
         headers['Expires'] = 0
 
-        f = open(filePath, 'rb')
-        content = f.read()
-        f.close()
-
         # Add some noise randomly, so images can't be saved and matched easily by filesize or checksum
-        content += self.utilRandomHexBytes( random.randint(0, 1500) )
+        if (useVariants):
+            noise = b''
+        elif (noiseSeed is not None):
+            noiseLength = int(self.utilSeededHexBytes(noiseSeed + ':length', 4), 16) % 1501
+            noise = self.utilSeededHexBytes(noiseSeed, noiseLength)
+
+            headers['Accept-Ranges'] = 'bytes'
+        else:
+            noise = self.utilRandomHexBytes( random.randint(0, 1500) )
+
+        if (content is not None):
+            fileSize = len(content)
+        else:
+            fileSize = fileEntry['size'] if fileEntry is not None else os.path.getsize(filePath)
+        totalLength = fileSize + len(noise)
+
+        byteRange = self.utilParseRange(rangeHeader, totalLength) if noiseSeed is not None else None
+        isPartial = byteRange is not None
+
+        if (isPartial):
+            # The response should be sent with a 206 Partial Content status
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (byteRange[0], byteRange[1], totalLength)
+        else:
+            byteRange = (0, totalLength - 1)
+
+        if (streamed):
+            stream = AssetStream(filePath, noise, content, start=byteRange[0], end=byteRange[1], fileSize=fileSize)
+            headers['Content-Length'] = str(len(stream))
+
+            return stream
+
+        # Files from a PackStore are memoryviews, and are only copied here, for the non streamed response
+        if (noise or not isinstance(content, bytes)):
+            content = b''.join((content, noise))
+
+        if (isPartial):
+            content = content[byteRange[0]:byteRange[1] + 1]
+            headers['Content-Length'] = str(len(content))
+
+        return content
+
+    # Get a file, with noise, as a data URI. Returns None if the file doesn't exist
+    def utilDataUri(self, filePath):
+        if (self.noiseVariants is not None):
+            content = self.noiseVariants.get(filePath, self.utilReadFile)
+
+            if (content is None):
+                return None
+
+            encoded = base64.b64encode(content)
+        else:
+            noise = self.utilRandomHexBytes( random.randint(0, 1500) )
+
+            if (self.assetCache is not None):
+                # Only the file's last bytes and the noise need to be encoded
+                cached = self.assetCache.getBase64(filePath)
+
+                if (cached is None):
+                    return None
+
+                encoded = cached[0] + base64.b64encode(cached[1] + noise)
+            else:
+                content = self.utilReadFile(filePath)
+
+                if (content is None):
+                    return None
+
+                encoded = base64.b64encode(content + noise)
+
+        return 'data:' + self.getMimeType(filePath) + ';base64,' + encoded.decode('ascii')
+
+    # Read file from the asset cache, or from disk if there's no cache. Returns None if the file doesn't exist
+    def utilReadFile(self, filePath):
+        if (self.assetCache is not None):
+            return self.assetCache.get(filePath)
+
+        start = timer() if self.metrics is not None else None
+        content = AssetCache.utilReadFile(filePath)
+
+        if (content is None):
+            return None
+
+        if (start is not None):
+            self.metrics.observe('disk_read_seconds', timer() - start)
 
         return content
 
+    # Record a streamImage or streamAudio call in the metrics
+    def utilRecordStream(self, streamType, start, content):
+        self.metrics.observe('stream_seconds', timer() - start, {'type': streamType})
+
+        if (content is False):
+            self.metrics.inc('stream_not_found_total', 1, {'type': streamType})
+        else:
+            self.metrics.inc('bytes_served_total', len(content), {'type': streamType})
+
+    # Record a validateImage or validateAudio call in the metrics
+    def utilRecordValidation(self, validationType, start, valid):
+        self.metrics.observe('validate_seconds', timer() - start, {'type': validationType})
+        self.metrics.inc('validations_total', 1, {'type': validationType, 'result': 'success' if valid else 'failure'})
+
     # Get File's mime type
     def getMimeType(self, filePath):
-        return mimetypes.guess_type(filePath)[0]
+        fileEntry = self.manifest.getFile(filePath) if self.manifest is not None else None
+
+        if (fileEntry is not None):
+            return fileEntry['mimeType']
+
+        extension = os.path.splitext(filePath)[1].lower()
+        mimeType = Captcha._mimeTypes.get(extension)
+
+        if (mimeType is None):
+            mimeType = Captcha._mimeTypes[extension] = mimetypes.guess_type(filePath)[0]
+
+        return mimeType
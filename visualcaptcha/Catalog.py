@@ -0,0 +1,302 @@
+import os
+import json
+import random
+import threading
+from collections import OrderedDict
+
+from .Sampler import Sampler
+from .OptionRecord import OptionRecord, OptionList
+
+
+class Catalog(object):
+
+    # The bundled assets, used when no assetsPath is given
+    defaultAssetsPath = os.path.dirname(os.path.realpath(__file__)) + '/assets'
+
+    # The number of catalogs for custom option lists kept loaded. The least recently used one is dropped first
+    maxCustomCatalogs = 16
+
+    # Catalogs for the JSON files, keyed by assets path, and for custom option lists, keyed by the contents of the lists
+    _catalogs = {}
+    _customCatalogs = OrderedDict()
+    _lock = threading.Lock()
+
+    # @param assetsPath is the full path to the assets directory
+    # @param imageOptions is the list of image option dicts
+    # @param audioOptions is the list of audio option dicts
+    def __init__(self, assetsPath, imageOptions, audioOptions):
+        self.assetsPath = assetsPath
+
+        imageOptions = imageOptions or ()
+        audioOptions = audioOptions or ()
+
+        # Keep our own compact copies, so changes to the caller's lists don't leak into other requests
+        self.imageRecords = tuple(OptionRecord.fromDict(option) for option in imageOptions)
+        self.audioRecords = tuple(OptionRecord.fromDict(option) for option in audioOptions)
+
+        # The options are only converted to dicts when they're read
+        self.imageOptions = OptionList(self.imageRecords)
+        self.audioOptions = OptionList(self.audioRecords)
+
+        # Find the catalog index of an option by its path, for compact challenges
+        self.imageIndexes = dict((record.path, index) for index, record in enumerate(self.imageRecords))
+        self.audioIndexes = dict((record.path, index) for index, record in enumerate(self.audioRecords))
+
+        # Options with a 'weight' are chosen more or less often than the others, which weigh 1
+        self.imageSampler = Sampler(len(self.imageRecords), self.utilWeights(imageOptions))
+        self.audioSampler = Sampler(len(self.audioRecords), self.utilWeights(audioOptions))
+
+    # Create a new challenge, with the session data for a new valid option
+    # @param numberOfOptions is the number of images to choose from
+    # @param randomHex is a function returning a new random hex string for the given number of bytes
+    # @param oldImageOption is optional. The previous valid image option, which won't be chosen again
+    # @param oldAudioOption is optional. The previous valid audio option, which won't be chosen again
+    def createChallenge(self, numberOfOptions, randomHex, oldImageOption=None, oldAudioOption=None):
+        imageValues = []
+
+        # Avoid the next IF failing if a string with a number is sent
+        numberOfOptions = int(numberOfOptions)
+
+        # Set the minimum numberOfOptions to four
+        if (numberOfOptions < 4):
+            numberOfOptions = 4
+
+        # Get a random sample of X images. The catalog is shared, so copy the options before setting values
+        images = self.utilImageOptions(self.imageSampler.sample(numberOfOptions))
+
+        # Set a random value for each of the images, to be used in the frontend
+        for image in images:
+            randomValue = randomHex(10)
+            imageValues.append(randomValue)
+
+            image['value'] = randomValue
+
+        # Select a random image option, pluck current valid image option
+        newImageOptions = [image for image in images if not oldImageOption or oldImageOption['path'] != image['path']]
+        newImageOption = random.choice(newImageOptions or images)
+
+        # Select a random audio option, pluck current valid audio option
+        oldAudioIndex = self.utilAudioIndexes([oldAudioOption['path']])[0] if oldAudioOption else None
+        newAudioOption = self.utilAudioOptions([self.audioSampler.choice(oldAudioIndex)])[0]
+
+        # Set random hashes for audio and image field names, and add it in the frontend data object
+        # The audio noise is derived from a secret seed, so every range request of the challenge gets the same noise
+        return {
+            'images': images,
+            'validImageOption': newImageOption,
+            'validAudioOption': newAudioOption,
+            'audioNoiseSeed': randomHex(16),
+            'frontendData': {
+                'values': imageValues,
+                'imageName': newImageOption['name'],
+                'imageFieldName': randomHex(10),
+                'audioFieldName': randomHex(10)
+            }
+        }
+
+    # Create many independent challenges, encoded with encodeChallenge so they're ready to be attached to sessions
+    # All the options are sampled and all the random hex is drawn in one pass, and the strings are built straight from
+    # the catalog indexes, without the option dicts createChallenge returns
+    # @param count is the number of challenges to create
+    # @param numberOfOptions is the number of images to choose from in each challenge
+    # @param randomHex is a function returning a new random hex string for the given number of bytes
+    def createChallenges(self, count, numberOfOptions, randomHex):
+        count = int(count)
+
+        # Set the minimum numberOfOptions to four
+        numberOfOptions = max(int(numberOfOptions), 4)
+
+        if (count <= 0):
+            return []
+
+        imageIndexes = self.imageSampler.sampleMany(count, numberOfOptions)
+        audioIndexes = self.audioSampler.choices(count)
+        randomValue = random.random
+
+        # Each challenge takes a slice of the random hex: its values and the image and audio field names, 20 characters each,
+        # then the audio noise seed. They're formatted in the encodeChallenge order
+        tokenOffsets = range(0, 20 * (numberOfOptions + 2), 20)
+        challengeLength = 20 * (numberOfOptions + 2) + 32
+        tokens = randomHex(count * challengeLength // 2)
+        challengeFormat = '|'.join(['.'.join(['%d'] * numberOfOptions), '%d', '%d', ','.join(['%s'] * numberOfOptions), '%s', '%s', '%s'])
+        encodedChallenges = []
+
+        for i in range(count):
+            start = i * challengeLength
+            seedStart = start + challengeLength - 32
+
+            encodedChallenges.append(challengeFormat % tuple(
+                imageIndexes[i] + [int(randomValue() * numberOfOptions), audioIndexes[i]] +
+                [tokens[start + offset:start + offset + 20] for offset in tokenOffsets] + [tokens[seedStart:seedStart + 32]]
+            ))
+
+        return encodedChallenges
+
+    # Encode a challenge as a short string, with the catalog indices of its options instead of copies of them
+    # The format is "imageIndexes|validImagePosition|audioIndex|values|imageFieldName|audioFieldName|audioNoiseSeed"
+    def encodeChallenge(self, challenge):
+        images = challenge['images']
+        frontendData = challenge['frontendData']
+
+        return '|'.join([
+            '.'.join(str(index) for index in self.utilImageIndexes([image['path'] for image in images])),
+            str(images.index(challenge['validImageOption'])),
+            str(self.utilAudioIndexes([challenge['validAudioOption']['path']])[0]),
+            ','.join(frontendData['values']),
+            frontendData['imageFieldName'],
+            frontendData['audioFieldName'],
+            challenge.get('audioNoiseSeed') or ''
+        ])
+
+    # Decode a challenge from encodeChallenge. Returns None if it doesn't match this catalog
+    def decodeChallenge(self, encodedChallenge):
+        try:
+            fields = encodedChallenge.split('|')
+
+            # Challenges encoded without an audio noise seed have one field less
+            if (len(fields) == 6):
+                fields.append('')
+
+            imageIndexes, validImagePosition, audioIndex, values, imageFieldName, audioFieldName, audioNoiseSeed = fields
+
+            values = values.split(',')
+            images = self.utilImageOptions([int(index) for index in imageIndexes.split('.')][:len(values)])
+
+            for image, value in zip(images, values):
+                image['value'] = value
+
+            validImageOption = images[int(validImagePosition)]
+            validAudioOption = self.utilAudioOptions([int(audioIndex)])[0]
+        except (ValueError, IndexError, AttributeError, TypeError):
+            return None
+
+        return {
+            'images': images,
+            'validImageOption': validImageOption,
+            'validAudioOption': validAudioOption,
+            'audioNoiseSeed': audioNoiseSeed or None,
+            'frontendData': {
+                'values': values,
+                'imageName': validImageOption['name'],
+                'imageFieldName': imageFieldName,
+                'audioFieldName': audioFieldName
+            }
+        }
+
+    # Get copies of the image options at the given indexes
+    def utilImageOptions(self, indexes):
+        return [self.imageRecords[index].toDict() for index in indexes]
+
+    # Get copies of the audio options at the given indexes
+    def utilAudioOptions(self, indexes):
+        return [self.audioRecords[index].toDict() for index in indexes]
+
+    # Get the indexes of the image options with the given paths, with None for unknown paths
+    def utilImageIndexes(self, paths):
+        return [self.imageIndexes.get(path) for path in paths]
+
+    # Get the indexes of the audio options with the given paths, with None for unknown paths
+    def utilAudioIndexes(self, paths):
+        return [self.audioIndexes.get(path) for path in paths]
+
+    # Get the shared catalog for the given assets path and option lists, loading it on first use
+    # Custom option lists are found by their contents, so new lists with the same options share a catalog
+    # @param assetsPath is optional. Defaults to ./assets
+    # @param defaultImages is optional. Defaults to the array inside ./images.json
+    # @param defaultAudios is optional. Defaults to the array inside ./audios.json
+    @classmethod
+    def load(cls, assetsPath='', defaultImages=None, defaultAudios=None):
+        # If no assetsPath is specified, set the default
+        if (not assetsPath or assetsPath == ''):
+            assetsPath = cls.defaultAssetsPath
+
+        # Empty lists use the JSON files
+        if (not defaultImages):
+            defaultImages = None
+
+        if (not defaultAudios):
+            defaultAudios = None
+
+        if (defaultImages is None and defaultAudios is None):
+            catalog = cls._catalogs.get(assetsPath)
+
+            if catalog is not None:
+                return catalog
+
+            with cls._lock:
+                catalog = cls._catalogs.get(assetsPath)
+
+                if catalog is None:
+                    catalog = cls._catalogs[assetsPath] = cls.utilBuild(assetsPath, defaultImages, defaultAudios)
+
+            return catalog
+
+        key = (assetsPath, cls.utilContentKey(defaultImages), cls.utilContentKey(defaultAudios))
+
+        with cls._lock:
+            catalog = cls._customCatalogs.pop(key, None)
+
+            if catalog is None:
+                catalog = cls.utilBuild(assetsPath, defaultImages, defaultAudios)
+
+            cls._customCatalogs[key] = catalog
+
+            while len(cls._customCatalogs) > cls.maxCustomCatalogs:
+                cls._customCatalogs.popitem(last=False)
+
+        return catalog
+
+    # Forget all the loaded catalogs, so they are read again from disk on next use
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._catalogs.clear()
+            cls._customCatalogs.clear()
+
+    # Build a new catalog, reading the default option lists from disk if needed
+    @classmethod
+    def utilBuild(cls, assetsPath, defaultImages, defaultAudios):
+        # If there are no defaultImages, get them from ./images.json
+        if (not defaultImages or len(defaultImages) == 0):
+            defaultImages = cls.utilReadJSON(assetsPath + '/images.json')
+
+        # If there are no defaultAudios, get them from ./audios.json
+        if (not defaultAudios or len(defaultAudios) == 0):
+            defaultAudios = cls.utilReadJSON(assetsPath + '/audios.json')
+
+        return cls(assetsPath, defaultImages, defaultAudios)
+
+    # Get a hashable key with the contents of an option list. Much cheaper than building a catalog, but still a pass over the list
+    @staticmethod
+    def utilContentKey(options):
+        if options is None:
+            return None
+
+        try:
+            key = tuple([tuple(option.items()) for option in options])
+            hash(key)
+        except TypeError:
+            # Options with lists or dicts as values
+            key = json.dumps(options, sort_keys=True, default=str)
+
+        return key
+
+    # Get the weights of a list of option dicts, or None if none of them has a weight
+    @staticmethod
+    def utilWeights(options):
+        if not any('weight' in option for option in options):
+            return None
+
+        return [option.get('weight', 1) for option in options]
+
+    # Read input file as JSON
+    @staticmethod
+    def utilReadJSON(filePath):
+        if (not os.path.isfile(filePath)):
+            return None
+
+        json_data = open(filePath)
+        data = json.load(json_data)
+        json_data.close()
+
+        return data
@@ -0,0 +1,110 @@
+import threading
+from collections import deque
+
+from .TokenSource import TokenSource
+
+
+class ChallengePool(object):
+
+    # @param catalog is the Catalog to create the challenges from
+    # @param numberOfOptions is optional. The number of images in each challenge. Defaults to 5
+    # @param size is optional. The maximum number of ready challenges. Defaults to 1000
+    # @param lowWater is optional. The pool is refilled when it has fewer ready challenges. Defaults to half the size
+    # @param batchSize is optional. The number of challenges created at once when refilling. Defaults to 100
+    # @param tokenSource is optional. The TokenSource to create the random values with
+    def __init__(self, catalog, numberOfOptions=5, size=1000, lowWater=None, batchSize=100, tokenSource=None):
+        self.catalog = catalog
+        self.tokenSource = tokenSource if tokenSource is not None else TokenSource()
+        self.numberOfOptions = max(int(numberOfOptions), 4)
+        self.size = int(size)
+        self.lowWater = int(lowWater) if lowWater is not None else self.size // 2
+        self.batchSize = int(batchSize)
+
+        self.served = 0
+        self.starvations = 0
+        self.failures = 0
+
+        self._challenges = deque()
+        self._refill = threading.Event()
+        self._running = False
+        self._stopped = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # Start the background thread that keeps the pool filled. It's started by the first get, unless the pool was stopped
+    def start(self):
+        with self._lock:
+            self._stopped = False
+
+            # Threads don't survive a fork, so a new one is started in each worker
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._running = True
+            self._thread = threading.Thread(target=self.run, name='visualcaptcha-challenge-pool')
+            self._thread.daemon = True
+            self._thread.start()
+
+        self._refill.set()
+
+    # Stop the background thread. It's only started again by start, get just returns the ready challenges
+    def stop(self):
+        self._stopped = True
+        self._running = False
+        self._refill.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Get a ready challenge, or None if the pool is empty
+    def get(self):
+        if not self._stopped and (self._thread is None or not self._thread.is_alive()):
+            self.start()
+
+        try:
+            challenge = self._challenges.popleft()
+        except IndexError:
+            with self._lock:
+                self.starvations += 1
+
+            self._refill.set()
+
+            return None
+
+        with self._lock:
+            self.served += 1
+
+        if len(self._challenges) < self.lowWater:
+            self._refill.set()
+
+        return challenge
+
+    # Get the pool counters
+    def stats(self):
+        return {
+            'depth': len(self._challenges),
+            'size': self.size,
+            'lowWater': self.lowWater,
+            'served': self.served,
+            'starvations': self.starvations,
+            'failures': self.failures
+        }
+
+    # Keep the pool filled until stopped
+    def run(self):
+        while self._running:
+            self._refill.wait()
+            self._refill.clear()
+
+            while self._running and len(self._challenges) < self.size:
+                count = min(self.batchSize, self.size - len(self._challenges))
+
+                try:
+                    self._challenges.extend([self.catalog.createChallenge(self.numberOfOptions, self.tokenSource.hex) for i in range(count)])
+                except Exception:
+                    # Keep the thread alive, and only try again on the next refill, so a broken catalog doesn't spin
+                    with self._lock:
+                        self.failures += 1
+
+                    break
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import hashlib
+import mimetypes
+
+from .Catalog import Catalog
+from .AssetCache import AssetCache
+
+
+class Manifest(object):
+
+    # The variants of the options, with the extension each one replaces in the option's path and its own
+    imageVariants = (('normal', None, None), ('retina', '.png', '@2x.png'))
+    audioVariants = (('mp3', None, None), ('ogg', '.mp3', '.ogg'))
+
+    # The resolved variants and files of the image and audio options, so streaming doesn't need regexes or stat calls
+    # @param assetsPath is the full path to the assets directory
+    # @param data is the dict from Manifest.compile or a manifest JSON file
+    def __init__(self, assetsPath, data):
+        self.assetsPath = assetsPath
+        self.data = data
+
+        # Files that are listed by the options but don't exist
+        self.missing = list(data.get('missing', ()))
+
+        # Full path of each file, with its size, mime type and hash
+        self.files = dict((assetsPath + '/' + filePath, entry) for filePath, entry in data['files'].items())
+
+        # Full path of each variant, by option path and variant name
+        self.paths = {}
+
+        for directory in ('images', 'audios'):
+            for optionPath, variants in data[directory].items():
+                for variant, filePath in variants.items():
+                    self.paths[(directory, optionPath, variant)] = assetsPath + '/' + filePath
+
+    # Get the full path of an image option's file, or None if it doesn't exist
+    # @param isRetina boolean. Defaults to false
+    def getImagePath(self, path, isRetina=False):
+        return self.paths.get(('images', path, 'retina' if isRetina else 'normal'))
+
+    # Get the full path of an audio option's file, or None if it doesn't exist
+    # @param fileType defaults to 'mp3', can also be 'ogg'
+    def getAudioPath(self, path, fileType='mp3'):
+        return self.paths.get(('audios', path, fileType))
+
+    # Get the size, mime type and hash of a file, or None if it's not in the manifest
+    def getFile(self, filePath):
+        return self.files.get(filePath)
+
+    # Write the manifest to a JSON file
+    def save(self, manifestPath):
+        with open(manifestPath, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+
+    # Read a manifest JSON file
+    # @param assetsPath is optional. Defaults to ./assets
+    @classmethod
+    def load(cls, manifestPath, assetsPath=''):
+        with open(manifestPath) as f:
+            data = json.load(f)
+
+        return cls(cls.utilAssetsPath(assetsPath), data)
+
+    # Find the files of every variant of the image and audio options
+    # @param assetsPath is optional. Defaults to ./assets
+    # @param imageOptions is optional. Defaults to the array inside ./images.json
+    # @param audioOptions is optional. Defaults to the array inside ./audios.json
+    @classmethod
+    def compile(cls, assetsPath='', imageOptions=None, audioOptions=None):
+        assetsPath = cls.utilAssetsPath(assetsPath)
+
+        if (not imageOptions):
+            imageOptions = Catalog.utilReadJSON(assetsPath + '/images.json')
+
+        if (not audioOptions):
+            audioOptions = Catalog.utilReadJSON(assetsPath + '/audios.json')
+
+        data = {'images': {}, 'audios': {}, 'files': {}, 'missing': []}
+
+        for directory, options, variants in (('images', imageOptions, cls.imageVariants), ('audios', audioOptions, cls.audioVariants)):
+            for option in options or ():
+                optionPath = option['path']
+                data[directory][optionPath] = {}
+
+                for variant, extension, variantExtension in variants:
+                    filePath = directory + '/' + cls.variantPath(optionPath, extension, variantExtension)
+                    entry = data['files'].get(filePath) or cls.utilFileEntry(assetsPath + '/' + filePath)
+
+                    if (entry is None):
+                        data['missing'].append(filePath)
+                        continue
+
+                    data['files'][filePath] = entry
+                    data[directory][optionPath][variant] = filePath
+
+        data['missing'] = sorted(set(data['missing']))
+
+        return cls(assetsPath, data)
+
+    # Get the path of an option's variant, replacing the extension at the end of its path, case insensitive
+    # Paths with another extension are used as they are
+    @staticmethod
+    def variantPath(path, extension, variantExtension):
+        if (extension is not None and path.lower().endswith(extension)):
+            return path[:-len(extension)] + variantExtension
+
+        return path
+
+    # Get the size, mime type and hash of a file, or None if it doesn't exist
+    @staticmethod
+    def utilFileEntry(filePath):
+        content = AssetCache.utilReadFile(filePath)
+
+        if (content is None):
+            return None
+
+        return {
+            'size': len(content),
+            'mimeType': mimetypes.guess_type(filePath)[0],
+            'hash': hashlib.sha256(content).hexdigest()
+        }
+
+    @staticmethod
+    def utilAssetsPath(assetsPath):
+        return assetsPath or Catalog.defaultAssetsPath
+
+    # Compile a manifest at build time, returning the exit status: python -m visualcaptcha --output manifest.json
+    @staticmethod
+    def main(argv=None):
+        # Only the command line needs argparse, so importing the package doesn't load it
+        import argparse
+
+        parser = argparse.ArgumentParser(prog='python -m visualcaptcha', description='Compile the visualCaptcha assets into a manifest')
+        parser.add_argument('--assets-path', default='', help='Assets directory, with images.json and audios.json. Defaults to the bundled assets')
+        parser.add_argument('--output', default='manifest.json', help='JSON file to write the manifest to')
+        arguments = parser.parse_args(argv)
+
+        manifest = Manifest.compile(arguments.assets_path)
+        manifest.save(arguments.output)
+
+        # Missing variants are reported, and fail the build
+        for filePath in manifest.missing:
+            sys.stderr.write('Missing ' + filePath + '\n')
+
+        print('%d files written to %s' % (len(manifest.files), os.path.abspath(arguments.output)))
+
+        return 1 if manifest.missing else 0
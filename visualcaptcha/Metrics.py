@@ -0,0 +1,179 @@
+import time
+import bisect
+import threading
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class Metrics(object):
+
+    # Latency buckets in seconds, from 10us to 1s
+    defaultBuckets = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+    # @param buckets is optional. The upper bounds of the latency histogram buckets, in seconds
+    # @param prefix is optional. Added to all the metric names. Defaults to 'visualcaptcha_'
+    def __init__(self, buckets=None, prefix='visualcaptcha_'):
+        self.buckets = tuple(sorted(buckets or Metrics.defaultBuckets))
+        self.prefix = prefix
+
+        self.counters = {}
+        self.histograms = {}
+        self.caches = []
+
+        self._lock = threading.Lock()
+
+    # Increase a counter
+    # @param name is the metric name, without the prefix
+    # @param value is optional. Defaults to 1
+    # @param labels is optional. A dict of label names and values
+    def inc(self, name, value=1, labels=None):
+        key = (name, self.utilLabelsKey(labels))
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # Record a duration in a latency histogram
+    # @param name is the metric name, without the prefix
+    # @param seconds is the duration
+    # @param labels is optional. A dict of label names and values
+    def observe(self, name, seconds, labels=None):
+        key = (name, self.utilLabelsKey(labels))
+        bucket = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            histogram = self.histograms.get(key)
+
+            if histogram is None:
+                # Counts per bucket, plus the +Inf bucket, then the sum
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+            histogram[bucket] += 1
+            histogram[-1] += seconds
+
+    # Export the counters of an AssetCache with the other metrics
+    def addCache(self, assetCache, name='asset'):
+        self.caches.append((name, assetCache))
+
+    # Get all the metrics in the Prometheus text format
+    def exposition(self):
+        lines = []
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(histogram)) for key, histogram in self.histograms.items())
+
+        for name, assetCache in self.caches:
+            stats = assetCache.stats()
+
+            for counter in ('hits', 'misses', 'evictions'):
+                counters.append((('cache_' + counter + '_total', (('cache', name),)), stats[counter]))
+
+            counters.append((('cache_bytes', (('cache', name),)), stats['size']))
+
+        # Lines of the same metric must be together
+        counters.sort()
+
+        typedNames = set()
+
+        for (name, labels), value in counters:
+            fullName = self.prefix + name
+
+            if fullName not in typedNames:
+                typedNames.add(fullName)
+                lines.append('# TYPE %s %s' % (fullName, 'counter' if name.endswith('_total') else 'gauge'))
+
+            lines.append('%s%s %s' % (fullName, self.utilFormatLabels(labels), self.utilFormatValue(value)))
+
+        for (name, labels), histogram in histograms:
+            fullName = self.prefix + name
+
+            if fullName not in typedNames:
+                typedNames.add(fullName)
+                lines.append('# TYPE %s histogram' % fullName)
+
+            count = 0
+
+            for bound, bucketCount in zip(self.buckets + ('+Inf',), histogram):
+                count += bucketCount
+                lines.append('%s_bucket%s %d' % (fullName, self.utilFormatLabels(labels + (('le', str(bound)),)), count))
+
+            lines.append('%s_sum%s %s' % (fullName, self.utilFormatLabels(labels), self.utilFormatValue(histogram[-1])))
+            lines.append('%s_count%s %d' % (fullName, self.utilFormatLabels(labels), count))
+
+        return '\n'.join(lines) + '\n'
+
+    # WSGI app serving the metrics, to be mounted on a local endpoint
+    def wsgiApp(self, environ, start_response):
+        content = self.exposition().encode('utf-8')
+
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4'), ('Content-Length', str(len(content)))])
+
+        return [content]
+
+    # Serve the metrics over HTTP from a background thread. Returns the server: call shutdown() to stop it, then server_close()
+    # to close its listening socket
+    # @param host is optional. Defaults to 127.0.0.1
+    # @param port is optional. Defaults to 9100
+    def serve(self, host='127.0.0.1', port=9100):
+        from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+        server = make_server(host, port, self.wsgiApp, handler_class=QuietHandler)
+
+        thread = threading.Thread(target=server.serve_forever, name='visualcaptcha-metrics')
+        thread.daemon = True
+        thread.start()
+
+        return server
+
+    def utilLabelsKey(self, labels):
+        return tuple(sorted(labels.items())) if labels else ()
+
+    def utilFormatLabels(self, labels):
+        if not labels:
+            return ''
+
+        return '{' + ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels) + '}'
+
+    def utilFormatValue(self, value):
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class InstrumentedBackend(object):
+
+    # Session backend recording the latency of every call to another backend
+    # @param backend is the SessionBackend to call
+    # @param metrics is the Metrics to record the calls in
+    def __init__(self, backend, metrics):
+        self.backend = backend
+        self.metrics = metrics
+
+    def get(self, key):
+        return self.utilCall('get', key)
+
+    def set(self, key, value, ttl=None):
+        return self.utilCall('set', key, value, ttl)
+
+    def getMany(self, keys):
+        return self.utilCall('getMany', keys)
+
+    def setMany(self, values, ttl=None):
+        return self.utilCall('setMany', values, ttl)
+
+    def delete(self, key):
+        return self.utilCall('delete', key)
+
+    def getAndDelete(self, key):
+        return self.utilCall('getAndDelete', key)
+
+    def utilCall(self, method, *args):
+        start = timer()
+
+        try:
+            return getattr(self.backend, method)(*args)
+        finally:
+            self.metrics.observe('session_backend_seconds', timer() - start, {'method': method})
@@ -0,0 +1,116 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+
+from .TokenSource import TokenSource
+
+
+class NoiseVariants(object):
+
+    # Files with their noise already added, so the streamed responses don't need to be built each time
+    # @param count is optional. The number of noisy variants kept for each file. Defaults to 8
+    # @param rotateSeconds is optional. The number of seconds before a file's variants are replaced. Defaults to 60
+    # @param tokenSource is optional. The TokenSource to create the noise with
+    # @param maxBytes is optional. The memory ceiling for the variants of all the files. Defaults to 64MB
+    def __init__(self, count=8, rotateSeconds=60, tokenSource=None, maxBytes=64 * 1024 * 1024):
+        self.count = max(int(count), 1)
+        self.rotateSeconds = rotateSeconds
+        self.tokenSource = tokenSource if tokenSource is not None else TokenSource()
+        self.maxBytes = int(maxBytes)
+        self.size = 0
+
+        self.rotations = 0
+        self.evictions = 0
+
+        # (expires, variants, size) by file path, the least recently used first
+        self._variants = OrderedDict()
+
+        # The files whose variants are being created by a thread
+        self._rotating = set()
+        self._lock = threading.Lock()
+
+    # Get a random noisy variant of a file
+    # @param filePath is the full path of the file
+    # @param readFile is the function reading the file contents, returning None if the file doesn't exist
+    # Returns None if the file doesn't exist
+    def get(self, filePath, readFile):
+        with self._lock:
+            entry = self._variants.get(filePath)
+
+            if entry is not None:
+                # Mark as recently used
+                del self._variants[filePath]
+                self._variants[filePath] = entry
+
+            # Only one thread creates the variants of a file, the others keep sending the old ones meanwhile
+            rotate = (entry is None or entry[0] < time.time()) and filePath not in self._rotating
+
+            if rotate:
+                self._rotating.add(filePath)
+
+        if not rotate:
+            if entry is not None:
+                return entry[1][random.randrange(len(entry[1]))]
+
+            # There are no variants yet, so the file gets its own noise, without keeping it
+            content = readFile(filePath)
+
+            return self.utilAddNoise(content) if content is not None else None
+
+        try:
+            content = readFile(filePath)
+
+            if content is None:
+                return None
+
+            variants = [self.utilAddNoise(content) for i in range(self.count)]
+            self.utilPut(filePath, (time.time() + self.rotateSeconds, variants, sum(len(variant) for variant in variants)))
+        finally:
+            with self._lock:
+                self._rotating.discard(filePath)
+
+        return variants[random.randrange(len(variants))]
+
+    # Remove all the variants, so they're created again on next use
+    def clear(self):
+        with self._lock:
+            self._variants.clear()
+            self.size = 0
+
+    # Get the number of files with variants, their size, and how many times they were created or evicted
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._variants),
+                'count': self.count,
+                'rotations': self.rotations,
+                'evictions': self.evictions,
+                'size': self.size,
+                'maxBytes': self.maxBytes
+            }
+
+    # Keep the variants of a file, evicting the least recently used files if needed
+    def utilPut(self, filePath, entry):
+        with self._lock:
+            self.rotations += 1
+
+            previous = self._variants.pop(filePath, None)
+
+            if previous is not None:
+                self.size -= previous[2]
+
+            # Variants bigger than the whole ceiling are never kept
+            if entry[2] > self.maxBytes:
+                return
+
+            self._variants[filePath] = entry
+            self.size += entry[2]
+
+            while self.size > self.maxBytes:
+                self.size -= self._variants.pop(next(iter(self._variants)))[2]
+                self.evictions += 1
+
+    # Add some noise randomly, so images can't be saved and matched easily by filesize or checksum
+    def utilAddNoise(self, content):
+        return b''.join((content, self.tokenSource.hexBytes(random.randint(0, 1500))))
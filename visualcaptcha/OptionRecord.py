@@ -0,0 +1,88 @@
+# Marks the keys an option dict doesn't have
+_missing = object()
+
+
+class OptionRecord(object):
+
+    # Compact catalog entry for an image or audio option, converted to a dict only when it leaves the catalog
+    __slots__ = ('name', 'path', 'value', 'extra')
+
+    # @param name is optional. The image name
+    # @param path is optional. The file path, relative to the images or audios directory
+    # @param value is optional. The audio answer
+    # @param extra is optional. A dict with any other keys of the option
+    def __init__(self, name=_missing, path=_missing, value=_missing, extra=None):
+        self.name = name
+        self.path = path
+        self.value = value
+        self.extra = extra
+
+    # Create a record from an option dict
+    @classmethod
+    def fromDict(cls, option):
+        extra = dict((key, value) for key, value in option.items() if key not in ('name', 'path', 'value'))
+
+        return cls(option.get('name', _missing), option.get('path', _missing), option.get('value', _missing), extra or None)
+
+    # Get a new option dict with the same keys as the one the record was created from
+    def toDict(self):
+        option = {}
+
+        if self.name is not _missing:
+            option['name'] = self.name
+
+        if self.path is not _missing:
+            option['path'] = self.path
+
+        if self.value is not _missing:
+            option['value'] = self.value
+
+        if self.extra:
+            option.update(self.extra)
+
+        return option
+
+
+class OptionList(object):
+
+    # Read-only list of OptionRecords, giving a new dict for each option that is read
+    __slots__ = ('records',)
+
+    def __init__(self, records):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [record.toDict() for record in self.records[index]]
+
+        return self.records[index].toDict()
+
+    def __iter__(self):
+        for record in self.records:
+            yield record.toDict()
+
+    # Compare and concatenate like the list of dicts it replaces
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, OptionList)):
+            return NotImplemented
+
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
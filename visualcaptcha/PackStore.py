@@ -0,0 +1,189 @@
+import os
+import mmap
+import json
+import base64
+import struct
+import threading
+
+from .AssetCache import AssetCache
+from .Catalog import Catalog
+
+class PackStore(object):
+
+    # Identifies pack files, followed by the length of the JSON index
+    magic = b'VCPK'
+
+    # All the images and audios in a single memory-mapped pack file, so pre-forked workers share one copy of them
+    # Can be used instead of an AssetCache, and its files are memoryview slices of the mapping
+    # @param packPath is the path of the pack file, created with PackStore.build
+    # @param assetsPath is optional. Defaults to ./assets
+    def __init__(self, packPath, assetsPath=''):
+        assetsPath = assetsPath or Catalog.defaultAssetsPath
+
+        self.packPath = packPath
+        self.assetsPath = assetsPath
+
+        with open(packPath, 'rb') as f:
+            header = f.read(8)
+
+            if (len(header) != 8 or header[:4] != PackStore.magic):
+                raise ValueError('Not a visualCaptcha pack file: ' + packPath)
+
+            indexLength = struct.unpack('>I', header[4:])[0]
+            index = json.loads(f.read(indexLength).decode('utf-8'))
+
+            # The pages are shared by every process mapping the file
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Python 2 mmaps don't support memoryview, so their files are copies of the pages
+        try:
+            self._view = memoryview(self._map)
+        except TypeError:
+            self._view = self._map
+
+        # Each thread counts its own hits and misses, so reading a file never waits on a lock
+        self._local = threading.local()
+        self._counters = []
+        self._finishedCounters = [0, 0]
+        self._lock = threading.Lock()
+
+        # The base64 encoding of each file's first bytes, a multiple of 3, like AssetCache.getBase64
+        self._encoded = {}
+
+        # Offset and length of each file in the pack, by its full path
+        dataStart = 8 + indexLength
+        self._files = dict((assetsPath + '/' + filePath, (dataStart + offset, length)) for filePath, (offset, length) in index.items())
+
+        self.size = sum(length for offset, length in self._files.values())
+
+    # Write all the images and audios to a new pack file. An existing file is replaced
+    # @param packPath is the path of the pack file
+    # @param assetsPath is optional. Defaults to ./assets
+    @classmethod
+    def build(cls, packPath, assetsPath=''):
+        assetsPath = assetsPath or Catalog.defaultAssetsPath
+
+        filePaths = []
+
+        for directory in ('images', 'audios'):
+            directoryPath = assetsPath + '/' + directory
+
+            if (os.path.isdir(directoryPath)):
+                filePaths.extend(directory + '/' + fileName for fileName in sorted(os.listdir(directoryPath)) if os.path.isfile(directoryPath + '/' + fileName))
+
+        # The offsets are relative to the end of the index
+        index = {}
+        offset = 0
+
+        for filePath in filePaths:
+            length = os.path.getsize(assetsPath + '/' + filePath)
+            index[filePath] = [offset, length]
+            offset += length
+
+        indexJSON = json.dumps(index, sort_keys=True).encode('utf-8')
+
+        # Write to a temporary file, so workers never map a half written pack
+        temporaryPath = packPath + '.tmp'
+
+        with open(temporaryPath, 'wb') as f:
+            f.write(PackStore.magic + struct.pack('>I', len(indexJSON)) + indexJSON)
+
+            for filePath in filePaths:
+                with open(assetsPath + '/' + filePath, 'rb') as assetFile:
+                    f.write(assetFile.read())
+
+        os.rename(temporaryPath, packPath)
+
+        return cls(packPath, assetsPath)
+
+    def __contains__(self, filePath):
+        return filePath in self._files
+
+    # Get a file as a memoryview of the pack. Files that aren't in the pack are read from disk
+    # Returns None if the file doesn't exist
+    def get(self, filePath):
+        entry = self._files.get(filePath)
+        counters = self._local.__dict__.get('counters') or self.utilCounters()
+
+        if entry is None:
+            counters[1] += 1
+
+            return AssetCache.utilReadFile(filePath)
+
+        counters[0] += 1
+
+        return self._view[entry[0]:entry[0] + entry[1]]
+
+    # Get the base64 encoding of a file, in the same format as AssetCache.getBase64
+    # The encoding is cached for the files in the pack. It's kept by each process, not shared like the pack
+    def getBase64(self, filePath):
+        encoded = self._encoded.get(filePath)
+
+        if encoded is not None:
+            self.get(filePath)
+
+            return encoded
+
+        content = self.get(filePath)
+
+        if content is None:
+            return None
+
+        split = len(content) - len(content) % 3
+        encoded = (base64.b64encode(content[:split]), bytes(content[split:]))
+
+        # Files read from disk may change, so only the pack's own files are kept. Another thread may store the same encoding
+        if filePath in self._files:
+            self._encoded[filePath] = encoded
+
+        return encoded
+
+    # Read every page of the pack, so the first requests don't wait on the disk
+    # @param assetsPath is ignored. The pack already has all the files, it's only accepted like AssetCache.preload
+    def preload(self, assetsPath=None):
+        for offset in range(0, len(self._map), mmap.PAGESIZE):
+            self._map[offset]
+
+    # Number of files found in the pack, by all the threads
+    @property
+    def hits(self):
+        return self._finishedCounters[0] + sum(counters[0] for thread, counters in self._counters)
+
+    # Number of files that weren't in the pack, by all the threads
+    @property
+    def misses(self):
+        return self._finishedCounters[1] + sum(counters[1] for thread, counters in self._counters)
+
+    # Get the pack counters, with the same keys as AssetCache.stats
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': 0,
+            'files': len(self._files),
+            'size': self.size,
+            'maxBytes': self.size
+        }
+
+    # Unmap the pack. No memoryview of it can be in use anymore
+    def close(self):
+        if isinstance(self._view, memoryview):
+            self._view.release()
+
+        self._map.close()
+
+    # Create this thread's hits and misses counters
+    def utilCounters(self):
+        counters = self._local.__dict__['counters'] = [0, 0]
+
+        with self._lock:
+            # The counters of finished threads can't change anymore, so they're added up, to not keep one pair per thread
+            for thread, threadCounters in self._counters:
+                if not thread.is_alive():
+                    self._finishedCounters[0] += threadCounters[0]
+                    self._finishedCounters[1] += threadCounters[1]
+
+            self._counters = [entry for entry in self._counters if entry[0].is_alive()]
+            self._counters.append((threading.current_thread(), counters))
+
+        return counters
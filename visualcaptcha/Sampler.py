@@ -0,0 +1,140 @@
+import random
+import bisect
+
+
+class Sampler(object):
+
+    # Draws distinct option indexes in O(k) for k options, however big the catalog is
+    # @param size is the number of options
+    # @param weights is optional. A list with the positive relative weight of each option. Defaults to the same for all
+    def __init__(self, size, weights=None):
+        self.size = int(size)
+        self.weights = None
+
+        if weights is not None:
+            self.weights = tuple(float(weight) for weight in weights)
+
+            if len(self.weights) != self.size or min(self.weights or (1,)) <= 0:
+                raise ValueError('There must be a positive weight for each option')
+
+            # Where the range of each option ends, to find the option for a random point with bisect
+            self.ends = []
+            total = 0.0
+
+            for weight in self.weights:
+                total += weight
+                self.ends.append(total)
+
+            self.total = total
+
+    # Get count distinct random indexes
+    # @param count is the number of indexes
+    # @param excluded is optional. Indexes that can't be chosen, unless there wouldn't be enough indexes left
+    def sample(self, count, excluded=()):
+        count = int(count)
+
+        if count > self.size:
+            raise ValueError('Sample larger than population')
+
+        if excluded:
+            excluded = sorted(set(index for index in excluded if index is not None and 0 <= index < self.size))
+
+            # With a single option, the previous one has to be chosen again
+            if count > self.size - len(excluded):
+                excluded = ()
+
+        if self.weights is None:
+            return self.utilSample(count, excluded)
+
+        return self.utilWeightedSample(count, excluded)
+
+    # Get many independent samples of count distinct random indexes, in one pass
+    # @param number is the number of samples
+    # @param count is the number of indexes in each sample
+    def sampleMany(self, number, count):
+        count = int(count)
+
+        if count > self.size:
+            raise ValueError('Sample larger than population')
+
+        if self.weights is not None:
+            return [self.utilWeightedSample(count, ()) for i in range(int(number))]
+
+        return [self.utilSample(count, ()) for i in range(int(number))]
+
+    # Get many independent random indexes, in one pass
+    # @param number is the number of indexes
+    def choices(self, number):
+        randomValue = random.random
+
+        if self.weights is None:
+            return [int(randomValue() * self.size) for i in range(int(number))]
+
+        return [min(bisect.bisect_right(self.ends, randomValue() * self.total), self.size - 1) for i in range(int(number))]
+
+    # Get a random index
+    # @param excluded is optional. An index that can't be chosen, unless it's the only one
+    def choice(self, excluded=None):
+        if self.weights is not None or self.size < 2:
+            return self.sample(1, () if excluded is None else (excluded,))[0]
+
+        if excluded is None or not 0 <= excluded < self.size:
+            return int(random.random() * self.size)
+
+        position = int(random.random() * (self.size - 1))
+
+        return position + 1 if position >= excluded else position
+
+    # Shuffle only the first count positions among the indexes that aren't excluded, with the swapped ones in a dict
+    # so no draw is ever rejected
+    def utilSample(self, count, excluded):
+        available = self.size - len(excluded)
+        swapped = {}
+        indexes = []
+
+        for i in range(count):
+            position = i + int(random.random() * (available - i))
+
+            indexes.append(swapped.get(position, position))
+            swapped[position] = swapped.get(i, i)
+
+        if excluded:
+            return [self.utilSkipExcluded(position, excluded) for position in indexes]
+
+        return indexes
+
+    # Map a position among the indexes that aren't excluded to its index
+    def utilSkipExcluded(self, position, excluded):
+        for index in excluded:
+            if position < index:
+                break
+
+            position += 1
+
+        return position
+
+    # Draw the indexes one by one, skipping the ranges of the excluded and already chosen ones
+    def utilWeightedSample(self, count, excluded):
+        excluded = list(excluded)
+        indexes = []
+
+        for i in range(count):
+            excludedWeight = sum(self.weights[index] for index in excluded)
+            point = random.random() * (self.total - excludedWeight)
+
+            for index in excluded:
+                if point < self.ends[index] - self.weights[index]:
+                    break
+
+                point += self.weights[index]
+
+            index = min(bisect.bisect_right(self.ends, point), self.size - 1)
+
+            # Rounding can land a point on the edge of an excluded range
+            while index in excluded:
+                index = (index + 1) % self.size
+
+            bisect.insort(excluded, index)
+            indexes.append(index)
+
+        return indexes
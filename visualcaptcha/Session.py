@@ -18,3 +18,7 @@ class Session(object):
             self.clear()
 
         self.session[self.namespace][key] = value
+
+    # Replace all the data in the namespace with a single write
+    def commit(self, values):
+        self.session[self.namespace] = dict(values)
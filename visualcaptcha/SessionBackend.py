@@ -0,0 +1,164 @@
+import json
+import time
+import threading
+
+
+class SessionBackend(object):
+
+    # Get the value of a key. Returns None if it doesn't exist or expired
+    def get(self, key):
+        raise NotImplementedError()
+
+    # Set the value of a key
+    # @param ttl is optional. Number of seconds until the key expires
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError()
+
+    # Get the values of many keys at once. Returns a dict with the keys that exist
+    def getMany(self, keys):
+        raise NotImplementedError()
+
+    # Set the values of many keys at once
+    # @param values is a dict with the keys and their values
+    # @param ttl is optional. Number of seconds until the keys expire
+    def setMany(self, values, ttl=None):
+        raise NotImplementedError()
+
+    # Remove a key
+    def delete(self, key):
+        raise NotImplementedError()
+
+    # Get the value of a key and remove it, atomically. Returns None if it doesn't exist or expired
+    def getAndDelete(self, key):
+        raise NotImplementedError()
+
+
+class MemoryBackend(SessionBackend):
+
+    # Values are stored serialized, so they behave like the ones of a networked store
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self.utilLoad(self.utilGet(key, time.time()))
+
+    def set(self, key, value, ttl=None):
+        self.setMany({key: value}, ttl)
+
+    def getMany(self, keys):
+        now = time.time()
+        values = {}
+
+        with self._lock:
+            for key in keys:
+                value = self.utilGet(key, now)
+
+                if value is not None:
+                    values[key] = self.utilLoad(value)
+
+        return values
+
+    def setMany(self, values, ttl=None):
+        expires = (time.time() + ttl) if ttl else None
+        values = dict((key, (json.dumps(value), expires)) for key, value in values.items())
+
+        with self._lock:
+            self.values.update(values)
+
+    def delete(self, key):
+        with self._lock:
+            self.values.pop(key, None)
+
+    def getAndDelete(self, key):
+        with self._lock:
+            value = self.utilGet(key, time.time())
+            self.values.pop(key, None)
+
+        return self.utilLoad(value)
+
+    # Get a serialized value, removing it if it expired
+    def utilGet(self, key, now):
+        value = self.values.get(key)
+
+        if value is None:
+            return None
+
+        if value[1] is not None and value[1] <= now:
+            del self.values[key]
+
+            return None
+
+        return value[0]
+
+    def utilLoad(self, value):
+        return json.loads(value) if value is not None else None
+
+
+class RedisBackend(SessionBackend):
+
+    # Requires the redis package
+    # @param url is optional. The Redis server URL. Defaults to redis://localhost:6379/0
+    # @param maxConnections is optional. The maximum number of pooled connections
+    # @param prefix is optional. Added to all the keys. Defaults to 'visualcaptcha:'
+    # @param client is optional. An existing redis client to use instead of creating a connection pool
+    def __init__(self, url='redis://localhost:6379/0', maxConnections=None, prefix='visualcaptcha:', client=None):
+        if client is None:
+            import redis
+
+            pool = redis.ConnectionPool.from_url(url, max_connections=maxConnections)
+            client = redis.Redis(connection_pool=pool)
+
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.utilLoad(self.client.get(self.prefix + key))
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=(int(ttl) if ttl else None))
+
+    def getMany(self, keys):
+        keys = list(keys)
+        values = {}
+
+        if not keys:
+            return values
+
+        for key, value in zip(keys, self.client.mget([self.prefix + key for key in keys])):
+            if value is not None:
+                values[key] = self.utilLoad(value)
+
+        return values
+
+    def setMany(self, values, ttl=None):
+        if not values:
+            return
+
+        # All the keys are sent in a single round-trip
+        pipeline = self.client.pipeline(transaction=True)
+
+        for key, value in values.items():
+            pipeline.set(self.prefix + key, json.dumps(value), ex=(int(ttl) if ttl else None))
+
+        pipeline.execute()
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def getAndDelete(self, key):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.get(self.prefix + key)
+        pipeline.delete(self.prefix + key)
+
+        return self.utilLoad(pipeline.execute()[0])
+
+    def utilLoad(self, value):
+        if value is None:
+            return None
+
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+
+        return json.loads(value)
@@ -0,0 +1,191 @@
+import os
+import hmac
+import json
+import time
+import base64
+import struct
+import hashlib
+import binascii
+import threading
+
+
+class SignedSession(object):
+
+    # The keyed HMACs derived from each secret, copied for every use instead of hashing the key again
+    _keys = {}
+
+    # The challenge state, with the answers, is sent to the frontend, so tokens are encrypted and then signed
+    # @param secret is the key used to encrypt and sign the tokens. It must be the same on every server
+    # @param token is optional. A token from dumps, with the challenge state
+    # @param ttl is optional. Number of seconds new tokens are valid for. Defaults to 600
+    # @param replayCache is optional. A cache of used tokens, so each token can only be validated once
+    def __init__(self, secret, token=None, ttl=600, replayCache=None):
+        self.secret = secret.encode('utf-8') if not isinstance(secret, bytes) else secret
+        self.ttl = ttl
+
+        # Separate keys for encrypting and signing, derived from the secret
+        keys = SignedSession._keys.get(self.secret)
+
+        if keys is None:
+            encryptionKey = hmac.new(self.secret, b'visualcaptcha:encrypt', hashlib.sha256).digest()
+            signingKey = hmac.new(self.secret, b'visualcaptcha:sign', hashlib.sha256).digest()
+
+            keys = SignedSession._keys[self.secret] = (hmac.new(encryptionKey, digestmod=hashlib.sha512), hmac.new(signingKey, digestmod=hashlib.sha256))
+
+        self._encryption, self._signing = keys
+        self.replayCache = replayCache
+
+        self.data = {}
+        self.token = None
+        self.tokenId = None
+        self.expires = None
+
+        if token:
+            self.loads(token)
+
+    def clear(self):
+        self.data = {}
+        self.token = None
+
+    def get(self, key):
+        return self.data.get(key, None)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.token = None
+
+    # Replace all the data with a single write
+    def commit(self, values):
+        self.data = dict(values)
+        self.token = None
+
+    # Get an encrypted and signed token with the current state, creating a new one if it changed
+    def dumps(self):
+        if self.token is not None:
+            return self.token
+
+        self.tokenId = binascii.hexlify(os.urandom(8)).decode('ascii')
+        self.expires = int(time.time()) + int(self.ttl)
+
+        payload = json.dumps({'i': self.tokenId, 'e': self.expires, 'd': self.data}, separators=(',', ':'))
+
+        # Each token has its own random nonce, so the same state never gives the same ciphertext
+        nonce = os.urandom(16)
+        payload = self.utilEncode(nonce + self.utilXor(payload.encode('utf-8'), nonce))
+
+        self.token = payload + '.' + self.utilEncode(self.utilSign(payload))
+
+        return self.token
+
+    # Load the state from a token. Invalid and expired tokens load an empty state
+    # Returns true if the token was loaded
+    def loads(self, token):
+        self.clear()
+
+        try:
+            payload, signature = token.split('.')
+
+            # The signature is checked before anything is decrypted
+            if not hmac.compare_digest(self.utilDecode(signature), self.utilSign(payload)):
+                return False
+
+            ciphertext = self.utilDecode(payload)
+
+            if len(ciphertext) < 16:
+                return False
+
+            data = json.loads(self.utilXor(ciphertext[16:], ciphertext[:16]).decode('utf-8'))
+
+            if data['e'] < time.time():
+                return False
+        except (ValueError, TypeError, KeyError, AttributeError, binascii.Error):
+            return False
+
+        self.data = data['d']
+        self.token = token
+        self.tokenId = data['i']
+        self.expires = data['e']
+
+        # The token can't be changed when streaming, so the audio noise is derived from it instead of stored
+        if 'audioNoiseSeed' not in self.data:
+            self.data['audioNoiseSeed'] = hmac.new(self.secret, ('noise:' + self.tokenId).encode('utf-8'), hashlib.sha256).hexdigest()
+
+        return True
+
+    # Mark the loaded token as used. Returns its data, or None if it was already used
+    def consume(self):
+        if self.tokenId is None:
+            return None
+
+        if self.replayCache is not None and not self.replayCache.add(self.tokenId, self.expires):
+            return None
+
+        return self.data
+
+    # Sign a token payload
+    def utilSign(self, payload):
+        signing = self._signing.copy()
+        signing.update(payload.encode('ascii'))
+
+        return signing.digest()
+
+    # Encrypt or decrypt bytes, XORing them with a keystream of HMAC-SHA512 blocks of the nonce and a counter
+    def utilXor(self, value, nonce):
+        if not value:
+            return b''
+
+        blocks = []
+
+        for counter in range((len(value) + 63) // 64):
+            block = self._encryption.copy()
+            block.update(nonce + struct.pack('>I', counter))
+            blocks.append(block.digest())
+
+        keystream = b''.join(blocks)[:len(value)]
+
+        if _intFromBytes is not None:
+            return (_intFromBytes(value, 'big') ^ _intFromBytes(keystream, 'big')).to_bytes(len(value), 'big')
+
+        # Python 2 has no int.from_bytes, so the XOR is done on the hex numbers
+        result = int(binascii.hexlify(value), 16) ^ int(binascii.hexlify(keystream), 16)
+
+        return binascii.unhexlify('%0*x' % (2 * len(value), result))
+
+    # Encode bytes as unpadded URL safe base64
+    def utilEncode(self, value):
+        return base64.urlsafe_b64encode(value).decode('ascii').rstrip('=')
+
+    # Decode unpadded URL safe base64
+    def utilDecode(self, value):
+        return base64.urlsafe_b64decode((value + '=' * (-len(value) % 4)).encode('ascii'))
+
+
+class MemoryReplayCache(object):
+
+    def __init__(self):
+        self.tokens = {}
+        self._lock = threading.Lock()
+        self._nextPurge = 0
+
+    # Add a used token, until it expires. Returns false if it was already added
+    # @param tokenId is the unique id of the token
+    # @param expires is the timestamp when the token expires
+    def add(self, tokenId, expires):
+        now = time.time()
+
+        with self._lock:
+            # Forget expired tokens from time to time
+            if now >= self._nextPurge:
+                self.tokens = dict((key, value) for key, value in self.tokens.items() if value >= now)
+                self._nextPurge = now + 60
+
+            if tokenId in self.tokens:
+                return False
+
+            self.tokens[tokenId] = expires
+
+        return True
+
+
+# XOR byte strings as big integers, from Python 3
+_intFromBytes = getattr(int, 'from_bytes', None)
@@ -0,0 +1,180 @@
+import os
+import json
+import sqlite3
+import threading
+
+from .Catalog import Catalog
+from .Sampler import Sampler
+
+
+class SqliteCatalog(Catalog):
+
+    # Catalog reading its options from a SQLite file, so only the options a challenge uses are kept in memory
+    # @param databasePath is the path of the SQLite file, created with SqliteCatalog.create
+    # @param assetsPath is optional. Defaults to ./assets
+    def __init__(self, databasePath, assetsPath=''):
+        assetsPath = assetsPath or Catalog.defaultAssetsPath
+
+        if (not os.path.isfile(databasePath)):
+            raise IOError('No catalog database at ' + databasePath)
+
+        self.databasePath = databasePath
+        self.assetsPath = assetsPath
+
+        # sqlite3 connections can't be shared between threads, or with forked processes
+        self._local = threading.local()
+
+        # All the connections opened, with their process id, so close can close them from any thread
+        self._connections = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.imageOptions = SqliteOptions(self, 'images')
+        self.audioOptions = SqliteOptions(self, 'audios')
+
+        self.imageSampler = Sampler(len(self.imageOptions), self.utilTableWeights('images'))
+        self.audioSampler = Sampler(len(self.audioOptions), self.utilTableWeights('audios'))
+
+    # Write image and audio options to a new SQLite file
+    # @param databasePath is the path of the SQLite file. An existing file is replaced
+    # @param imageOptions is optional. The list of image option dicts. Defaults to the array inside ./images.json
+    # @param audioOptions is optional. The list of audio option dicts. Defaults to the array inside ./audios.json
+    # @param assetsPath is optional. Defaults to ./assets
+    @classmethod
+    def create(cls, databasePath, imageOptions=None, audioOptions=None, assetsPath=''):
+        assetsPath = assetsPath or Catalog.defaultAssetsPath
+
+        if (not imageOptions):
+            imageOptions = Catalog.utilReadJSON(assetsPath + '/images.json')
+
+        if (not audioOptions):
+            audioOptions = Catalog.utilReadJSON(assetsPath + '/audios.json')
+
+        if (os.path.isfile(databasePath)):
+            os.remove(databasePath)
+
+        connection = sqlite3.connect(databasePath)
+
+        try:
+            for table, options in (('images', imageOptions), ('audios', audioOptions)):
+                connection.execute('CREATE TABLE %s (id INTEGER PRIMARY KEY, path TEXT NOT NULL, weight REAL, data TEXT NOT NULL)' % table)
+                connection.execute('CREATE INDEX %s_path ON %s (path)' % (table, table))
+                connection.executemany('INSERT INTO %s (id, path, weight, data) VALUES (?, ?, ?, ?)' % table, (
+                    (index, option['path'], option.get('weight'), json.dumps(option)) for index, option in enumerate(options or ())
+                ))
+
+            connection.commit()
+        finally:
+            connection.close()
+
+        return cls(databasePath, assetsPath)
+
+    # Close the connections of every thread. New ones are opened if the catalog is used again
+    def close(self):
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+            self._generation += 1
+
+        for pid, connection in connections:
+            # The connections inherited from a parent process are still used by the parent
+            if pid == os.getpid():
+                connection.close()
+
+    def utilImageOptions(self, indexes):
+        return self.utilRows('images', indexes)
+
+    def utilAudioOptions(self, indexes):
+        return self.utilRows('audios', indexes)
+
+    def utilImageIndexes(self, paths):
+        return self.utilIndexes('images', paths)
+
+    def utilAudioIndexes(self, paths):
+        return self.utilIndexes('audios', paths)
+
+    # Get the options with the given ids, in the same order, with a single query
+    def utilRows(self, table, ids):
+        ids = [int(index) for index in ids]
+
+        if (not ids):
+            return []
+
+        rows = dict(self.utilQuery('SELECT id, data FROM %s WHERE id IN (%s)' % (table, ','.join('?' * len(ids))), ids))
+
+        # Missing ids raise the same error as for a list
+        try:
+            return [json.loads(rows[index]) for index in ids]
+        except KeyError:
+            raise IndexError('No option with this id')
+
+    # Get the ids of the options with the given paths, with None for unknown paths
+    def utilIndexes(self, table, paths):
+        if (not paths):
+            return []
+
+        # Like the in-memory catalog, the last option wins if there are duplicated paths
+        rows = dict(self.utilQuery('SELECT path, MAX(id) FROM %s WHERE path IN (%s) GROUP BY path' % (table, ','.join('?' * len(paths))), list(paths)))
+
+        return [rows.get(path) for path in paths]
+
+    # Get the weights of the options in a table, or None if none of them has a weight
+    def utilTableWeights(self, table):
+        if (not self.utilQuery('SELECT 1 FROM %s WHERE weight IS NOT NULL LIMIT 1' % table)):
+            return None
+
+        return [1 if weight is None else weight for (weight,) in self.utilQuery('SELECT weight FROM %s ORDER BY id' % table)]
+
+    def utilQuery(self, query, parameters=()):
+        return self.utilConnection().execute(query, parameters).fetchall()
+
+    # Get this thread's connection, opening it on first use, or after close
+    def utilConnection(self):
+        connection = getattr(self._local, 'connection', None)
+
+        if (connection is None or self._local.pid != os.getpid() or self._local.generation != self._generation):
+            # Each connection is only used by its own thread, but close may be called from another one
+            connection = sqlite3.connect(self.databasePath, check_same_thread=False)
+            pid = os.getpid()
+
+            with self._lock:
+                self._connections.append((pid, connection))
+                self._local.generation = self._generation
+
+            self._local.connection = connection
+            self._local.pid = pid
+
+        return connection
+
+
+class SqliteOptions(object):
+
+    # Read-only list of the options in a SqliteCatalog table, for getAllImageOptions and getAllAudioOptions
+    def __init__(self, catalog, table):
+        self.catalog = catalog
+        self.table = table
+        self.size = catalog.utilQuery('SELECT COUNT(*) FROM %s' % table)[0][0]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ids = list(range(*index.indices(self.size)))
+
+            # Read in batches, so a query never has too many parameters
+            return [option for start in range(0, len(ids), 500) for option in self.catalog.utilRows(self.table, ids[start:start + 500])]
+
+        if (index < 0):
+            index += self.size
+
+        if (not 0 <= index < self.size):
+            raise IndexError('Option index out of range')
+
+        return self.catalog.utilRows(self.table, [index])[0]
+
+    # Read the options in batches, so they're never all in memory at once
+    def __iter__(self):
+        for start in range(0, self.size, 1000):
+            for index, data in self.catalog.utilQuery('SELECT id, data FROM %s WHERE id >= ? AND id < ? ORDER BY id' % self.table, (start, start + 1000)):
+                yield json.loads(data)
@@ -0,0 +1,133 @@
+import os
+
+
+class AssetStream(object):
+
+    # @param filePath is the full path of the streamed file
+    # @param noise is the random noise sent after the file
+    # @param content is optional. The file contents already in memory, so the file isn't read from disk
+    # @param chunkSize is optional. Defaults to 64KB
+    # @param start is optional. The first byte to send, for range requests. Defaults to 0
+    # @param end is optional. The last byte to send, for range requests. Defaults to the last byte of the noise
+    # @param fileSize is optional. The size of the file on disk, if it's already known
+    def __init__(self, filePath, noise, content=None, chunkSize=65536, start=0, end=None, fileSize=None):
+        self.filePath = filePath
+        self.noise = noise
+        self.content = content
+        self.chunkSize = chunkSize
+
+        if (content is not None):
+            self.fileSize = len(content)
+        elif (fileSize is not None):
+            self.fileSize = fileSize
+        else:
+            self.fileSize = os.path.getsize(filePath)
+
+        self.totalLength = self.fileSize + len(noise)
+
+        self.start = start
+        self.end = (self.totalLength - 1) if end is None else end
+
+        self.length = self.end - self.start + 1
+
+        self._file = None
+
+    def __len__(self):
+        return self.length
+
+    # Yield the file in chunks, followed by the noise. WSGI servers only accept bytes, so a cached file sent
+    # whole is yielded as is, but memoryview chunks, such as PackStore files, are copied one chunk at a time
+    # Use sendfile to send them without copying
+    def __iter__(self):
+        for chunk in self.utilChunks():
+            yield chunk if isinstance(chunk, bytes) else chunk.tobytes()
+
+    # Yield the file in chunks, followed by the noise. Chunks of in-memory files are memoryviews, so nothing is copied
+    def utilChunks(self):
+        fileStart, fileEnd = self.utilFileWindow()
+
+        if (isinstance(self.content, bytes) and fileStart == 0 and fileEnd == self.fileSize):
+            if self.content:
+                yield self.content
+        elif (self.content is not None):
+            view = memoryview(self.content)
+
+            for offset in range(fileStart, fileEnd, self.chunkSize):
+                yield view[offset:min(offset + self.chunkSize, fileEnd)]
+        elif (fileStart < fileEnd):
+            self._file = open(self.filePath, 'rb')
+            self._file.seek(fileStart)
+
+            remaining = fileEnd - fileStart
+
+            while remaining > 0:
+                chunk = self._file.read(min(self.chunkSize, remaining))
+
+                if not chunk:
+                    break
+
+                remaining -= len(chunk)
+
+                yield chunk
+
+            self.close()
+
+        noise = self.utilNoiseWindow()
+
+        if noise:
+            yield noise
+
+    # Send the whole response to a socket, using os.sendfile for files that are not in memory
+    # @param sock is a connected socket object
+    def sendfile(self, sock):
+        if (self.content is not None or not hasattr(os, 'sendfile')):
+            for chunk in self.utilChunks():
+                sock.sendall(chunk)
+
+            return
+
+        offset, fileEnd = self.utilFileWindow()
+
+        f = open(self.filePath, 'rb')
+
+        try:
+            while offset < fileEnd:
+                sent = os.sendfile(sock.fileno(), f.fileno(), offset, fileEnd - offset)
+
+                if sent == 0:
+                    break
+
+                offset += sent
+        finally:
+            f.close()
+
+        noise = self.utilNoiseWindow()
+
+        if noise:
+            sock.sendall(noise)
+
+    # Get the start and end offsets of the file bytes inside the sent range
+    def utilFileWindow(self):
+        fileStart = min(self.start, self.fileSize)
+        fileEnd = min(self.end + 1, self.fileSize)
+
+        return fileStart, max(fileStart, fileEnd)
+
+    # Get the part of the noise inside the sent range
+    def utilNoiseWindow(self):
+        noiseStart = max(self.start - self.fileSize, 0)
+        noiseEnd = self.end + 1 - self.fileSize
+
+        if (noiseEnd <= noiseStart):
+            return b''
+
+        if (noiseStart == 0 and noiseEnd == len(self.noise)):
+            return self.noise
+
+        return self.noise[noiseStart:noiseEnd]
+
+    # Release the open file, if any. WSGI servers call this when the response is done
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,80 @@
+import os
+import binascii
+import threading
+
+
+class TokenSource(object):
+
+    # Incremented in forked processes, so they never reuse the random bytes their parent has already read
+    forks = 0
+
+    # Random hex tokens sliced from large urandom blocks, so most tokens don't need a syscall
+    # @param blockSize is optional. The number of random bytes read at once by each thread. Defaults to 8192
+    def __init__(self, blockSize=8192):
+        self.blockSize = int(blockSize)
+
+        # Each thread slices its own block, so no lock is needed
+        self._local = threading.local()
+
+    # Get a hex string from count random bytes
+    def hex(self, count):
+        state = self.utilState(count)
+
+        if state is None:
+            return _hexText(binascii.hexlify(os.urandom(count)))
+
+        end = state['offset']
+
+        return state['text'][end - 2 * count:end]
+
+    # Get hex bytes from count random bytes
+    def hexBytes(self, count):
+        state = self.utilState(count)
+
+        if state is None:
+            return binascii.hexlify(os.urandom(count))
+
+        end = state['offset']
+
+        return state['block'][end - 2 * count:end]
+
+    # Reserve count random bytes in this thread's block, reading a new one if needed
+    # Returns the thread's state, with the offset just after the reserved bytes, or None if they don't fit in a block
+    def utilState(self, count):
+        state = self._local.__dict__
+
+        # A new thread has no block, so it always reads one, even for an empty token
+        end = state.get('offset', 0) + 2 * count
+
+        if end > state.get('length', -1) or state['forks'] != TokenSource.forks or (_checkPid and state['pid'] != os.getpid()):
+            if count > self.blockSize:
+                return None
+
+            # The block is hexlified once, so each token is just a slice of it
+            # Its text and bytes share the offset, so the same random bytes are never used twice
+            state['block'] = binascii.hexlify(os.urandom(self.blockSize))
+            state['text'] = _hexText(state['block'])
+            state['length'] = len(state['block'])
+            state['forks'] = TokenSource.forks
+            state['pid'] = os.getpid()
+            end = 2 * count
+
+        state['offset'] = end
+
+        return state
+
+    @classmethod
+    def utilForked(cls):
+        cls.forks += 1
+
+
+# Hex tokens are str, which is already bytes on Python 2
+def _hexText(block):
+    return block if str is bytes else block.decode('ascii')
+
+
+# With fork hooks, the process id doesn't need to be checked for every token
+_checkPid = not hasattr(os, 'register_at_fork')
+
+if not _checkPid:
+    os.register_at_fork(after_in_child=TokenSource.utilForked)
@@ -0,0 +1,32 @@
+import gc
+import mimetypes
+
+from .Catalog import Catalog
+from .Captcha import Captcha
+
+
+# Load everything the first request of a worker would, before the server forks, so the workers share it copy-on-write
+# @param assetsPath is optional. Defaults to ./assets
+# @param defaultImages is optional. Defaults to the array inside ./images.json
+# @param defaultAudios is optional. Defaults to the array inside ./audios.json
+# @param assetCache is optional. An AssetCache to read all the files into, or a PackStore to read all the pages of
+# @param freeze boolean. Defaults to false. If true, gc.freeze is called last, so the collector doesn't copy the shared pages
+# Returns the shared catalog
+def warmup(assetsPath='', defaultImages=None, defaultAudios=None, assetCache=None, freeze=False):
+    catalog = Catalog.load(assetsPath, defaultImages, defaultAudios)
+
+    # Read the system mime types database, and resolve the extensions of the streamed files
+    mimetypes.init()
+    visualCaptcha = Captcha({}, catalog=catalog)
+
+    for extension in ('.png', '.mp3', '.ogg'):
+        visualCaptcha.getMimeType('warmup' + extension)
+
+    if (assetCache is not None):
+        assetCache.preload(catalog.assetsPath)
+
+    # gc.freeze is only available from Python 3.7
+    if (freeze and hasattr(gc, 'freeze')):
+        gc.freeze()
+
+    return catalog
@@ -1,3 +1,58 @@
 #!/usr/bin/env python
+import sys
+
 from .Session import *
+from .SignedSession import *
+from .SessionBackend import *
+from .BackendSession import *
+from .Sampler import *
+from .OptionRecord import *
+from .Catalog import *
+from .Manifest import *
+from .AssetCache import *
+from .PackStore import *
+from .Stream import *
+from .ChallengePool import *
+from .Metrics import *
+from .TokenSource import *
+from .NoiseVariants import *
 from .Captcha import *
+from .Warmup import *
+
+# Names of the modules importing asyncio or sqlite3, which are only loaded when one of their names is used
+# AsyncCaptcha needs async/await and asyncio.get_running_loop, from Python 3.7
+_lazyNames = {
+    'SqliteCatalog': 'SqliteCatalog',
+    'SqliteOptions': 'SqliteCatalog'
+}
+
+if sys.version_info >= (3, 7):
+    _lazyNames['AsyncCaptcha'] = 'AsyncCaptcha'
+    _lazyNames['AsyncBackendSession'] = 'AsyncCaptcha'
+
+__all__ = [
+    'Session', 'SignedSession', 'MemoryReplayCache', 'SessionBackend', 'MemoryBackend', 'RedisBackend', 'BackendSession',
+    'Sampler', 'OptionRecord', 'OptionList', 'Catalog', 'Manifest', 'AssetCache', 'PackStore', 'AssetStream', 'ChallengePool',
+    'Metrics', 'InstrumentedBackend', 'TokenSource', 'NoiseVariants', 'Captcha', 'warmup'
+] + sorted(_lazyNames)
+
+if sys.version_info >= (3, 7):
+    import importlib
+
+    # Import the module of a lazy name on first use
+    def __getattr__(name):
+        moduleName = _lazyNames.get(name)
+
+        if moduleName is None:
+            raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+        module = importlib.import_module('.' + moduleName, __name__)
+
+        # Importing the module set the package attribute with its name to the module, so replace them all
+        for lazyName, lazyModuleName in _lazyNames.items():
+            if lazyModuleName == moduleName:
+                globals()[lazyName] = getattr(module, lazyName)
+
+        return globals()[name]
+else:
+    from .SqliteCatalog import *
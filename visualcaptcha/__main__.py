@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+import sys
+
+from .Manifest import Manifest
+
+sys.exit(Manifest.main())